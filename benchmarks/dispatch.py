@@ -0,0 +1,98 @@
+"""
+Micro-benchmark for ``BaseModuleVisitor.visit`` dispatch.
+
+Compares the legacy per-call lookup (``'visit_' + name`` + ``getattr`` +
+symbols check) against the per-class dispatch table, first as a pure
+dispatch loop for every backend and then as a full ``PythonVisitor``
+transpile of a synthetic module.
+
+    python -m benchmarks.dispatch --functions 2000
+"""
+import ast
+import time
+
+from benchmarks.generators import many_functions
+from visitors.base import BaseModuleVisitor
+from visitors.c import CVisitor
+from visitors.python import PythonVisitor
+from visitors.rust.rust import BaseRustVisitor, Pyo3RustVisitor
+
+
+def legacy_lookup(visitor: BaseModuleVisitor, node):
+    """Dispatch exactly as ``BaseModuleVisitor.visit`` did before the table."""
+    if type(node) in visitor.symbols:
+        return visitor.python_symbol
+    method = 'visit_' + node.__class__.__name__
+    return getattr(visitor, method, visitor.generic_visit)
+
+
+def table_lookup(visitor: BaseModuleVisitor, node):
+    try:
+        return visitor._dispatch[type(node)]
+    except KeyError:
+        return visitor.resolve_visitor(type(node))
+
+
+class LegacyPythonVisitor(PythonVisitor):
+    """``visit`` as it was before the dispatch table and lazy docstrings."""
+
+    def visit(self, node, level: int = 0):
+        if type(node) in self.symbols:
+            return self.python_symbol(node)
+        visitor = getattr(self, 'visit_' + node.__class__.__name__, self.generic_visit)
+        node.docstring = self.get_docstring(
+            node, default=self.DEFAULT_MODULE_DOCSTRING
+        )
+        return visitor(node, level)
+
+
+def bench_lookup(visitor, nodes, lookup, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for node in nodes:
+            lookup(visitor, node)
+    return len(nodes) * repeat / (time.perf_counter() - started)
+
+
+def bench_transpile(visitor_cls, source, repeat):
+    visited = 0
+    elapsed = 0.0
+    for _ in range(repeat):
+        tree = ast.parse(source)
+        nodes = sum(1 for _ in ast.walk(tree))
+        visitor = visitor_cls(module="<benchmark>")
+        started = time.perf_counter()
+        visitor.transpile(tree)
+        elapsed += time.perf_counter() - started
+        visited += nodes
+    return visited / elapsed
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.dispatch')
+    parser.add_argument('--functions', type=int, default=1000,
+                        help='number of functions in the synthetic module')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='how many times each measurement is repeated')
+    args = parser.parse_args()
+
+    source = many_functions(args.functions)["many_functions.py"]
+    nodes = list(ast.walk(ast.parse(source)))
+    print(f"{len(nodes)} nodes, {args.repeat} repeats, nodes/sec\n")
+    print(f"{'visitor':<20}{'legacy':>14}{'table':>14}{'speedup':>10}")
+
+    for visitor in (PythonVisitor(module="<benchmark>"), BaseRustVisitor(),
+                    Pyo3RustVisitor(), CVisitor()):
+        legacy = bench_lookup(visitor, nodes, legacy_lookup, args.repeat)
+        table = bench_lookup(visitor, nodes, table_lookup, args.repeat)
+        print(f"{type(visitor).__name__:<20}{legacy:>14,.0f}{table:>14,.0f}{table / legacy:>9.2f}x")
+
+    legacy = bench_transpile(LegacyPythonVisitor, source, args.repeat)
+    table = bench_transpile(PythonVisitor, source, args.repeat)
+    print(f"{'transpile (python)':<20}{legacy:>14,.0f}{table:>14,.0f}{table / legacy:>9.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,4 @@
+# imports a module with its own name: both are saved to main.py while
+# this one is still being written
+x = 1
+import pkg.main
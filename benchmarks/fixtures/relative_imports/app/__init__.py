@@ -0,0 +1,2 @@
+# relative imports, resolved the same way by the import graph and by a
+# plain run whether the source root is this directory or app/
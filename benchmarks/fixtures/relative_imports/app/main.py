@@ -0,0 +1,6 @@
+from .pkg import helper
+from . import util as tools
+
+
+def run():
+    return tools.twice(helper.value())
@@ -0,0 +1,5 @@
+from ..util import twice
+
+
+def value():
+    return twice(21)
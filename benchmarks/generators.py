@@ -0,0 +1,82 @@
+"""
+Synthetic inputs for the benchmarks. Every generator returns the files of
+a project, by path relative to its source root, so single large modules
+and wide import graphs are run the same way.
+"""
+from typing import Callable, Dict, Tuple
+
+Files = Dict[str, str]
+
+
+def many_functions(functions: int = 2000) -> Files:
+    """One module with many small functions"""
+    buf = []
+    for i in range(functions):
+        buf.append(f"def func_{i}(a: int, b: int = {i}):\n"
+                   f"    x = a + b * {i} - (a // 2) % 3\n"
+                   f"    if x > {i} and a != b:\n"
+                   f"        return call_{i}(x, a, b)\n"
+                   f"    return [x, a, b][0]\n")
+    return {"many_functions.py": "\n".join(buf)}
+
+
+def deep_nesting(depth: int = 60, blocks: int = 20) -> Files:
+    """Functions whose bodies nest if/for/while blocks *depth* levels deep"""
+    keywords = ("if x > {i}:", "for i_{i} in range({i}):", "while x < {i}:")
+    buf = []
+    for block in range(blocks):
+        lines = [f"def nested_{block}(x: int):"]
+        for level in range(depth):
+            header = keywords[level % len(keywords)].format(i=level)
+            lines.append("    " * (level + 1) + header)
+            lines.append("    " * (level + 2) + f"x = x + {level}")
+        lines.append("    " * (depth + 1) + "return x")
+        buf.append("\n".join(lines) + "\n")
+    return {"deep_nesting.py": "\n".join(buf)}
+
+
+def long_expressions(terms: int = 400, statements: int = 50) -> Files:
+    """Assignments of long arithmetic and boolean expressions"""
+    operators = (" + ", " * ", " - ", " // ")
+    buf = []
+    for s in range(statements):
+        arithmetic = "".join(f"a{t}{operators[t % len(operators)]}" for t in range(terms)) + "a0"
+        boolean = " and ".join(f"(b{t} or c{t})" for t in range(terms // 4))
+        buf.append(f"x_{s} = {arithmetic}\n"
+                   f"y_{s} = {boolean}\n")
+    return {"long_expressions.py": "\n".join(buf)}
+
+
+def class_hierarchy(classes: int = 300, methods: int = 6) -> Files:
+    """A chain of classes, each deriving from the previous one"""
+    buf = ["class Base0:\n    value: int = 0\n"]
+    for c in range(1, classes):
+        lines = [f"class Base{c}(Base{c - 1}):"]
+        for m in range(methods):
+            lines.append(f"    def method_{m}(self, a: int, b: int = {m}) -> int:\n"
+                         f"        return self.value + a * b + {c}\n")
+        buf.append("\n".join(lines))
+    return {"class_hierarchy.py": "\n".join(buf)}
+
+
+def wide_imports(modules: int = 200, imports: int = 20) -> Files:
+    """A package of modules, each importing up to *imports* of the previous ones"""
+    files = {"wide/__init__.py": ""}
+    for m in range(modules):
+        lines = [f"import wide.module_{i}" for i in range(max(0, m - imports), m)]
+        lines.append(f"from wide.module_{max(0, m - 1)} import value_{max(0, m - 1)}\n" if m else "")
+        lines.append(f"value_{m} = {m}\n")
+        lines.append(f"def function_{m}(a: int, b: int = {m}):\n"
+                     f"    return a + b\n")
+        files[f"wide/module_{m}.py"] = "\n".join(lines)
+    return files
+
+
+# generator and the parameter --scale multiplies
+GENERATORS: Dict[str, Tuple[Callable[..., Files], str]] = {
+    "many_functions": (many_functions, "functions"),
+    "deep_nesting": (deep_nesting, "blocks"),
+    "long_expressions": (long_expressions, "statements"),
+    "class_hierarchy": (class_hierarchy, "classes"),
+    "wide_imports": (wide_imports, "modules"),
+}
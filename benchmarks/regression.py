@@ -0,0 +1,278 @@
+"""
+Golden output and throughput regression checks.
+
+Every fixture of sources/ and benchmarks/fixtures/ is transpiled by
+main.py, with each traversal, and its result is compared file by file
+with its golden output: result/ for multiply_import.py (see result.md),
+benchmarks/golden/<fixture>/ for the others. Then the fixtures and the
+synthetic cases of benchmarks.suite are timed in process, and their
+lines/s compared with a stored baseline.
+
+The import graph fixtures are transpiled in process from each of their
+source roots, once with the graph pre-pass and once without it: both
+must reach the same modules.
+
+    python -m benchmarks.regression                    # check
+    python -m benchmarks.regression --require-baseline # check, failing without a baseline
+    python -m benchmarks.regression --update-golden    # accept output changes
+    python -m benchmarks.regression --update-baseline  # store the current throughput
+
+The baseline depends on the machine, it is not committed: store one before
+optimizing, check against it after, with --require-baseline so that a
+missing baseline fails instead of skipping the comparison. Exits with 1
+when an output changed, a fixture failed or the throughput dropped more
+than --max-slowdown.
+"""
+import argparse
+import difflib
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+from benchmarks.generators import GENERATORS
+from benchmarks.suite import git_commit, run_case
+from visitors.base import TRAVERSALS
+from visitors.output import MemoryOutput
+from visitors.python.api import transpile_source
+from visitors.python.batch import BatchTranspiler
+from visitors.python.import_rebuilder import DONE
+from visitors.python.module_index import ModuleIndex
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# fixture -> directory of its golden output, relative to the repository,
+# and the suffix of the golden files. Generated code is not always valid
+# Python, the goldens under benchmarks/ are kept away from compileall
+GOLDEN_SUFFIX = ".golden"
+FIXTURES = {
+    "sources/multiply_import.py": ("result", ""),
+    "sources/func.py": ("benchmarks/golden/func", GOLDEN_SUFFIX),
+    "sources/decorator.py": ("benchmarks/golden/decorator", GOLDEN_SUFFIX),
+    "sources/indent.py": ("benchmarks/golden/indent", GOLDEN_SUFFIX),
+    "sources/multiple_inheritance.py": ("benchmarks/golden/multiple_inheritance", GOLDEN_SUFFIX),
+    # regression cases of earlier bugs
+    "benchmarks/fixtures/name_collision/main.py": ("benchmarks/golden/name_collision", GOLDEN_SUFFIX),
+}
+# module importing the others of its fixture -> source roots it is
+# transpiled from, relative to the repository
+GRAPH_FIXTURES = {
+    "benchmarks/fixtures/relative_imports/app/main.py": ("benchmarks/fixtures/relative_imports",
+                                                         "benchmarks/fixtures/relative_imports/app"),
+}
+DEFAULT_BASELINE = os.path.join(ROOT, "benchmarks", "baseline.json")
+
+
+def read_tree(directory: str, suffix: str = "") -> Dict[str, bytes]:
+    """Files under *directory* by relative path without *suffix*, without byte code"""
+    files = {}
+    for dir_path, dir_names, file_names in os.walk(directory):
+        dir_names[:] = sorted(name for name in dir_names if name != "__pycache__")
+        for name in sorted(file_names):
+            path = os.path.join(dir_path, name)
+            rel_path = os.path.relpath(path, directory)
+            if suffix and rel_path.endswith(suffix):
+                rel_path = rel_path[:-len(suffix)]
+            with open(path, "rb") as f:
+                files[rel_path] = f.read()
+    return files
+
+
+def write_tree(files: Dict[str, bytes], directory: str, suffix: str = ""):
+    if os.path.isdir(directory):
+        shutil.rmtree(directory)
+    for rel_path, content in files.items():
+        path = os.path.join(directory, rel_path + suffix)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(content)
+
+
+def diff_trees(expected: Dict[str, bytes], actual: Dict[str, bytes]) -> List[str]:
+    """Unified diff lines between two file trees, empty when they are the same"""
+    lines = []
+    for path in sorted(set(expected) | set(actual)):
+        old, new = expected.get(path), actual.get(path)
+        if old == new:
+            continue
+        if old is None:
+            lines.append(f"+++ {path} (unexpected file)")
+            continue
+        if new is None:
+            lines.append(f"--- {path} (missing)")
+            continue
+        lines.extend(difflib.unified_diff(old.decode("utf-8", "replace").splitlines(),
+                                          new.decode("utf-8", "replace").splitlines(),
+                                          f"golden/{path}", f"output/{path}", lineterm=""))
+    return lines
+
+
+def run_fixture(fixture: str, output: str, traversal: str) -> Optional[str]:
+    """Transpile *fixture* with main.py into *output*, returns the error output if it failed"""
+    result = subprocess.run(
+        [sys.executable, os.path.join(ROOT, "main.py"), fixture, "--output", output, "--traversal", traversal],
+        cwd=ROOT, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True,
+    )
+    if result.returncode:
+        return result.stdout.strip() or f"exit status {result.returncode}"
+    return None
+
+
+def check_golden(traversals: List[str], update: bool) -> List[str]:
+    errors = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for fixture, (golden, suffix) in FIXTURES.items():
+            golden_dir = os.path.join(ROOT, golden)
+            for traversal in traversals:
+                output = os.path.join(tmp, os.path.basename(golden), traversal)
+                error = run_fixture(fixture, output, traversal)
+                if error is not None:
+                    print(f"{fixture:44} {traversal:10} FAILED")
+                    errors.append(f"{fixture} ({traversal}) failed:\n{error}")
+                    continue
+                actual = read_tree(output)
+                if update and traversal == traversals[0]:
+                    write_tree(actual, golden_dir, suffix)
+                    print(f"{fixture:44} {traversal:10} updated {golden}")
+                    continue
+                diff = diff_trees(read_tree(golden_dir, suffix), actual)
+                print(f"{fixture:44} {traversal:10} {'changed' if diff else 'ok'}")
+                if diff:
+                    errors.append(f"{fixture} ({traversal}) differs from {golden}:\n" + "\n".join(diff))
+    return errors
+
+
+def check_graph() -> List[str]:
+    """Compare the modules of the import graph with those a run without it transpiles"""
+    errors = []
+    for fixture, source_roots in GRAPH_FIXTURES.items():
+        module = os.path.join(ROOT, fixture)
+        # every other module of the package is imported, directly or not
+        package_dir = os.path.dirname(module)
+        expected = {os.path.join(dir_path, name) for dir_path, _, names in os.walk(package_dir)
+                    for name in names if name.endswith(".py")}
+        expected.discard(os.path.join(package_dir, "__init__.py"))
+        for source_root in source_roots:
+            with tempfile.TemporaryDirectory() as tmp:
+                graph = BatchTranspiler(tmp, os.path.join(ROOT, source_root), output=MemoryOutput()) \
+                    .build_graph([module])
+                batch = BatchTranspiler(tmp, os.path.join(ROOT, source_root), output=MemoryOutput())
+                batch.transpile([module])
+            transpiled = set(batch.import_tree_rebuilder.registry.with_state(DONE))
+            problems = []
+            if set(graph.modules) != transpiled:
+                problems.append("graph: " + ", ".join(sorted(os.path.relpath(path, ROOT) for path in graph.modules)))
+                problems.append("run:   " + ", ".join(sorted(os.path.relpath(path, ROOT) for path in transpiled)))
+            missing = expected - transpiled
+            if missing:
+                problems.append("not imported: " + ", ".join(sorted(os.path.relpath(path, ROOT) for path in missing)))
+            print(f"{fixture} from {source_root:44} {'differs' if problems else 'ok'}")
+            if problems:
+                errors.append(f"{fixture} (source root {source_root}):\n" + "\n".join(problems))
+    return errors
+
+
+def time_fixture(fixture: str, repeat: int) -> dict:
+    """Best in-process time of transpiling *fixture* and its imports in memory"""
+    path = os.path.join(ROOT, fixture)
+    source_root = os.path.dirname(path)
+    with open(path, encoding="utf-8") as f:
+        source = f.read()
+    module_index = ModuleIndex([source_root] + sys.path)
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        transpile_source(source, module_name=os.path.basename(path), source_root=source_root,
+                         module_index=module_index)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    lines = len(source.splitlines())
+    return {"lines": lines, "total_s": best, "lines_per_s": round(lines / best) if best else None}
+
+
+def measure(repeat: int, cases: List[str], scale: float) -> Dict[str, dict]:
+    results = {}
+    for fixture in FIXTURES:
+        results[fixture] = time_fixture(fixture, repeat)
+    for name in cases:
+        result = run_case(name, "python", scale, max(1, repeat // 10), TRAVERSALS[0])
+        results[f"suite:{name}"] = result
+    return results
+
+
+def check_throughput(results: Dict[str, dict], baseline: Optional[dict], max_slowdown: float) -> List[str]:
+    errors = []
+    print(f"{'':46} {'lines/s':>10} {'baseline':>10}")
+    for name, result in results.items():
+        if "error" in result:
+            print(f"{name:46} {'-':>10}  {result['error']}")
+            errors.append(f"{name} failed: {result['error']}")
+            continue
+        row = f"{name:46} {result['lines_per_s']:10d}"
+        old = (baseline or {}).get("results", {}).get(name, {}).get("lines_per_s")
+        if old:
+            ratio = result["lines_per_s"] / old
+            row += f" {old:10d} {ratio:6.2f}x"
+            if ratio < 1 - max_slowdown:
+                row += "  SLOWER"
+                errors.append(f"{name}: {result['lines_per_s']} lines/s, {1 - ratio:.0%} below the baseline")
+        print(row)
+    return errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--traversal", nargs="+", default=list(TRAVERSALS), choices=TRAVERSALS,
+                        help="traversals whose output is compared with the golden output")
+    parser.add_argument("--update-golden", action="store_true",
+                        help="replace the golden outputs with the current ones")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, metavar="PATH")
+    parser.add_argument("--update-baseline", action="store_true",
+                        help="store the current throughput as the baseline")
+    parser.add_argument("--require-baseline", action="store_true",
+                        help="fail when there is no baseline to compare the throughput with")
+    parser.add_argument("--max-slowdown", type=float, default=0.3,
+                        help="fail when lines/s drops more than this fraction below the baseline")
+    parser.add_argument("--repeat", type=int, default=30, help="runs per fixture, the best one is kept")
+    parser.add_argument("--cases", nargs="*", default=list(GENERATORS), choices=list(GENERATORS),
+                        help="synthetic cases of benchmarks.suite timed along with the fixtures")
+    parser.add_argument("--scale", type=float, default=0.25, help="size of the synthetic cases")
+    parser.add_argument("--no-timing", action="store_true", help="only compare the outputs")
+    args = parser.parse_args()
+
+    errors = check_golden(args.traversal, args.update_golden)
+    errors += check_graph()
+
+    if not args.no_timing:
+        print()
+        results = measure(args.repeat, args.cases, args.scale)
+        baseline = None
+        if args.update_baseline:
+            with open(args.baseline, "w", encoding="utf-8") as f:
+                json.dump({"commit": git_commit(), "scale": args.scale, "results": results}, f, indent=1)
+                f.write("\n")
+        elif os.path.exists(args.baseline):
+            with open(args.baseline, encoding="utf-8") as f:
+                baseline = json.load(f)
+            if baseline.get("scale") != args.scale:
+                print(f"baseline {args.baseline} was measured at scale {baseline.get('scale')}, "
+                      f"the synthetic cases are not compared")
+                baseline["results"] = {name: result for name, result in baseline["results"].items()
+                                       if not name.startswith("suite:")}
+        elif args.require_baseline:
+            errors.append(f"no baseline in {args.baseline}, store one with --update-baseline")
+        else:
+            print(f"no baseline in {args.baseline}, store one with --update-baseline")
+        errors += check_throughput(results, baseline, args.max_slowdown)
+
+    for error in errors:
+        print(f"\nFAIL: {error}", file=sys.stderr)
+    sys.exit(1 if errors else 0)
+
+
+if __name__ == "__main__":
+    main()
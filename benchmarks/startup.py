@@ -0,0 +1,124 @@
+"""
+Cold-start check of the CLI.
+
+Runs ``python -X importtime main.py`` on a tiny file a few times, with
+the python backend and with the c backend, and fails when the imports
+take longer than the budget, or when a module that the run does not need
+gets imported: other backends, the process pool, the server, the caches.
+
+    python -m benchmarks.startup --budget-ms 80
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+from statistics import median
+from typing import Dict, List, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# only imported when the matching backend or mode is selected
+LAZY_MODULES = (
+    "visitors.c",
+    "visitors.rust",
+    "visitors.cython",
+    "visitors.ast_cache",
+    "visitors.memory",
+    "visitors.phases",
+    "visitors.profiler",
+    "visitors.stats",
+    "visitors.python.api",
+    "visitors.python.batch",
+    "visitors.python.manifest",
+    "visitors.python.server",
+    "visitors.python.watch",
+    "concurrent.futures",
+    "multiprocessing",
+    "socketserver",
+    "pickle",
+    "tracemalloc",
+)
+
+# backend -> modules it must not import, on top of LAZY_MODULES
+BACKEND_RUNS = {
+    "python": (),
+    "c": ("visitors.python",),
+}
+
+
+def import_times(stderr: str) -> Tuple[float, Dict[str, float]]:
+    """Total import time and cumulative time of every module, in ms"""
+    total = 0.0
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if not cumulative.strip().isdigit():
+            # header line
+            continue
+        ms = int(cumulative) / 1000
+        modules[name.strip()] = ms
+        if not name.startswith("  "):
+            total += ms
+    return total, modules
+
+
+def lazy_modules(backend: str) -> Tuple[str, ...]:
+    """Modules a single file run of *backend* must not import"""
+    own = f"visitors.{backend}"
+    return tuple(name for name in LAZY_MODULES if name != own) + BACKEND_RUNS[backend]
+
+
+def run_once(source_path: str, output: str, backend: str) -> Tuple[float, Dict[str, float]]:
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", os.path.join(ROOT, "main.py"), source_path, "--output", output,
+         "--backend", backend],
+        cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, check=True,
+    )
+    return import_times(result.stderr)
+
+
+def check(runs: int, budget_ms: float, top: int, backend: str) -> List[str]:
+    errors = []
+    with tempfile.TemporaryDirectory() as tmp:
+        source_path = os.path.join(tmp, "tiny.py")
+        with open(source_path, "w") as f:
+            f.write("def f(a: int, b: int = 1):\n    return a + b\n")
+        results = [run_once(source_path, os.path.join(tmp, "result"), backend) for _ in range(runs)]
+
+    total = median(t for t, _ in results)
+    modules = results[-1][1]
+    print(f"{backend} imports: {total:.1f} ms (median of {runs} runs, budget {budget_ms:.0f} ms)")
+    for name, ms in sorted(modules.items(), key=lambda item: -item[1])[:top]:
+        print(f"  {ms:8.1f} ms  {name}")
+
+    if total > budget_ms:
+        errors.append(f"{backend} imports take {total:.1f} ms, over the {budget_ms:.0f} ms budget")
+    lazy = lazy_modules(backend)
+    for name in sorted(modules):
+        if any(name == module or name.startswith(module + ".") for module in lazy):
+            errors.append(f"{name} is imported by a single file {backend} run")
+    return errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=80.0)
+    parser.add_argument("--top", type=int, default=10, help="slowest imports to list")
+    parser.add_argument("--backend", nargs="+", default=list(BACKEND_RUNS), choices=list(BACKEND_RUNS),
+                        help="backends whose single file run is checked")
+    args = parser.parse_args()
+
+    errors = []
+    for backend in args.backend:
+        errors += check(args.runs, args.budget_ms, args.top, backend)
+    for error in errors:
+        print(f"FAIL: {error}", file=sys.stderr)
+    sys.exit(1 if errors else 0)
+
+
+if __name__ == "__main__":
+    main()
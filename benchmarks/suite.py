@@ -0,0 +1,206 @@
+"""
+Throughput benchmarks over synthetic inputs (see benchmarks.generators).
+
+For every case and backend, parse, visit and save are timed separately
+(best of --repeat runs), then the case runs once more under tracemalloc
+for its peak memory. Results can be written as JSON and compared with
+the results of another commit.
+
+    python -m benchmarks.suite --json before.json
+    python -m benchmarks.suite --json after.json --compare before.json
+"""
+import argparse
+import functools
+import inspect
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Dict, List, Optional
+
+from benchmarks.generators import GENERATORS, Files
+from visitors.backends import BACKENDS, get_backend
+from visitors.base import RECURSIVE, TRAVERSALS
+from visitors.output import DiskOutput
+from visitors.python.import_rebuilder import ImportTreeRebuilder
+from visitors.python.module_index import ModuleIndex
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PHASES = ("parse", "visit", "save")
+
+
+def case_params(name: str, scale: float) -> dict:
+    generator, scaled = GENERATORS[name]
+    params = {key: p.default for key, p in inspect.signature(generator).parameters.items()}
+    params[scaled] = max(1, int(params[scaled] * scale))
+    return params
+
+
+def quiet_output() -> DiskOutput:
+    output = DiskOutput()
+    output.verbose = False
+    return output
+
+
+def write_files(files: Files, root: str) -> List[str]:
+    paths = []
+    for rel_path, source in files.items():
+        path = os.path.join(root, rel_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(source)
+        paths.append(path)
+    return paths
+
+
+def run_python(paths: List[str], sources: Dict[str, str], root: str, result_dir: str, traversal: str) -> dict:
+    visitor_cls = get_backend("python")
+    rebuilder = ImportTreeRebuilder(result_dir, visitor_cls, root, module_index=ModuleIndex([root] + sys.path),
+                                    output=quiet_output(), source_root=root, traversal=traversal)
+    # as in a batch: imports of the project are resolved but not transpiled twice
+    for path in paths:
+        rebuilder.registry.claim(path)
+
+    times = dict.fromkeys(PHASES, 0.0)
+    for path in paths:
+        started = time.perf_counter()
+        tree = visitor_cls.parse(sources[path], path, type_comments=True)
+        parsed = time.perf_counter()
+        visitor = visitor_cls(path, result_dir_path=result_dir, rebuild_imports_tree=True, source_root=root,
+                              import_tree_rebuilder=rebuilder, traversal=traversal)
+        visitor.transpile(tree, indent=4)
+        visited = time.perf_counter()
+        visitor.save_result_source()
+        times["parse"] += parsed - started
+        times["visit"] += visited - parsed
+        times["save"] += time.perf_counter() - visited
+    started = time.perf_counter()
+    rebuilder.output.flush()
+    times["save"] += time.perf_counter() - started
+    return times
+
+
+def run_backend(backend: str, paths: List[str], sources: Dict[str, str], root: str, result_dir: str,
+                traversal: str) -> dict:
+    """Transpile each file on its own, the way main.py --backend does"""
+    visitor_cls = get_backend(backend)
+    output = quiet_output()
+    times = dict.fromkeys(PHASES, 0.0)
+    for path in paths:
+        started = time.perf_counter()
+        tree = visitor_cls.parse(sources[path], path, type_comments=True)
+        parsed = time.perf_counter()
+        visitor = visitor_cls(traversal=traversal)
+        visitor.transpile(tree, indent=4)
+        visited = time.perf_counter()
+        target = os.path.join(result_dir, os.path.splitext(os.path.relpath(path, root))[0]
+                              + BACKENDS[backend].extension)
+        output.write(target, visitor.sink.getvalue())
+        times["parse"] += parsed - started
+        times["visit"] += visited - parsed
+        times["save"] += time.perf_counter() - visited
+    return times
+
+
+def run_case(name: str, backend: str, scale: float, repeat: int, traversal: str) -> dict:
+    params = case_params(name, scale)
+    files = GENERATORS[name][0](**params)
+    lines = sum(len(source.splitlines()) for source in files.values())
+    result = {"case": name, "params": params, "backend": backend, "traversal": traversal,
+              "files": len(files), "lines": lines, "bytes": sum(len(source) for source in files.values())}
+    if backend == "python":
+        run = run_python
+    else:
+        run = functools.partial(run_backend, backend)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = os.path.join(tmp, "src")
+        paths = write_files(files, root)
+        sources = {path: files[os.path.relpath(path, root)] for path in paths}
+        best: Optional[dict] = None
+        try:
+            for i in range(repeat):
+                times = run(paths, sources, root, os.path.join(tmp, f"result{i}"), traversal)
+                best = times if best is None else {phase: min(best[phase], times[phase]) for phase in PHASES}
+            tracemalloc.start()
+            try:
+                run(paths, sources, root, os.path.join(tmp, "result-memory"), traversal)
+                result["peak_memory_bytes"] = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+        except Exception as e:
+            result["error"] = f"{e.__class__.__name__}: {e}"
+            return result
+
+    total = sum(best.values())
+    result.update({f"{phase}_s": round(best[phase], 6) for phase in PHASES})
+    result["total_s"] = round(total, 6)
+    result["lines_per_s"] = round(lines / total) if total else None
+    return result
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_results(results: List[dict], baseline: Dict[tuple, dict] = None):
+    print(f"{'case':18} {'backend':8} {'lines':>7} {'parse':>8} {'visit':>8} {'save':>8} "
+          f"{'lines/s':>9} {'peak MiB':>9}")
+    for r in results:
+        if "error" in r:
+            print(f"{r['case']:18} {r['backend']:8} {r['lines']:7d}  {r['error']}")
+            continue
+        row = (f"{r['case']:18} {r['backend']:8} {r['lines']:7d} {r['parse_s']:8.3f} {r['visit_s']:8.3f} "
+               f"{r['save_s']:8.3f} {r['lines_per_s']:9d} {r['peak_memory_bytes'] / 2 ** 20:9.1f}")
+        old = (baseline or {}).get((r["case"], r["backend"]))
+        if old and old.get("lines_per_s"):
+            row += f"  {r['lines_per_s'] / old['lines_per_s']:.2f}x"
+        print(row)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cases", nargs="+", default=list(GENERATORS), choices=list(GENERATORS))
+    parser.add_argument("--backends", nargs="+", default=["python", "rust", "c"], choices=sorted(BACKENDS))
+    parser.add_argument("--scale", type=float, default=1.0, help="multiplies the size of every case")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per case, the best one is kept")
+    parser.add_argument("--traversal", default=RECURSIVE, choices=TRAVERSALS)
+    parser.add_argument("--json", metavar="PATH", help="write the results to PATH")
+    parser.add_argument("--compare", metavar="PATH", help="results of an earlier run to compare lines/s with")
+    args = parser.parse_args()
+
+    results = []
+    for name in args.cases:
+        for backend in args.backends:
+            results.append(run_case(name, backend, args.scale, args.repeat, args.traversal))
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = {(r["case"], r["backend"]): r for r in json.load(f)["results"]}
+    print_results(results, baseline)
+
+    if args.json:
+        report = {
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "scale": args.scale,
+            "repeat": args.repeat,
+            "results": results,
+        }
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=1)
+            f.write("\n")
+
+
+if __name__ == "__main__":
+    main()
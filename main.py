@@ -1,8 +1,14 @@
 import ast
 import os.path
+import sys
 from io import BufferedReader, FileIO
 
-from visitors.python import PythonVisitor
+from visitors.backends import BACKENDS, backend_names, get_backend
+from visitors.base import RECURSIVE, TRAVERSALS, BaseModuleVisitor
+
+# batch, watch and server modes import their modules (process pools,
+# sockets) when they are selected, to keep single file runs fast to start;
+# the python backend is only imported when it is selected
 
 
 # https://greentreesnakes.readthedocs.io/en/latest/tofrom.html
@@ -12,9 +18,14 @@ def main():
     import argparse
 
     parser = argparse.ArgumentParser(prog='python -m ast')
-    parser.add_argument('infile', type=argparse.FileType(mode='rb'), nargs='?',
-                        default='-',
-                        help='the file to parse; defaults to stdin')
+    parser.add_argument('infile', nargs='*', default=['-'],
+                        help='the file to parse; defaults to stdin. Several files or '
+                             'a source directory are transpiled in one batch')
+    parser.add_argument('--files-from', type=str, metavar='PATH',
+                        help="batch mode: read the files to parse from PATH ('-' for stdin)")
+    parser.add_argument('--source-root', type=str,
+                        help='batch mode: modules keep their path relative to this directory '
+                             'in the output (defaults to the common directory of the inputs)')
     parser.add_argument('-m', '--mode', default='exec',
                         choices=('exec', 'single', 'eval', 'func_type'),
                         help='specify what kind of code must be parsed')
@@ -25,20 +36,148 @@ def main():
                              'column offsets')
     parser.add_argument('-i', '--indent', type=int, default=4,
                         help='indentation of nodes (number of spaces)')
-    parser.add_argument('--output', type=str, required=True, help='Output directory')
+    parser.add_argument('--output', type=str, help='Output directory (required unless --serve)')
+    parser.add_argument('-b', '--backend', default='python', choices=backend_names(),
+                        help='target language; backends other than python transpile a single file '
+                             'without its imports')
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='batch mode: number of worker processes')
+    parser.add_argument('--incremental', action='store_true',
+                        help='only transpile modules whose source, imports or backend changed '
+                             'since the last run into the same output directory')
+    parser.add_argument('--ast-cache', type=str, metavar='DIR',
+                        help='keep parsed trees in DIR, keyed by source hash and Python version')
+    parser.add_argument('--index-snapshot', type=str, metavar='PATH',
+                        help='keep the module resolution index in PATH to skip the '
+                             'directory walk on the next run')
+    parser.add_argument('--watch', action='store_true',
+                        help='stay running and transpile changed modules and their importers again')
+    parser.add_argument('--watch-interval', type=float, default=0.1, metavar='SECONDS',
+                        help='how often --watch looks for changes')
+    parser.add_argument('--graph', type=str, metavar='PATH',
+                        help='batch mode: write the import graph to PATH, as DOT if it ends '
+                             'with .dot and as JSON otherwise (implies --topological)')
+    parser.add_argument('--topological', action='store_true',
+                        help='batch mode: build the import graph first and transpile every '
+                             'module after the modules it imports')
+    parser.add_argument('--allow-import', action='append', default=[], metavar='PATTERN',
+                        help='also transpile the imported modules named PATTERN (fnmatch, '
+                             "'*' for all) or under the directory PATTERN (with a path separator); "
+                             'by default only modules under the source root are transpiled')
+    parser.add_argument('--deny-import', action='append', default=[], metavar='PATTERN',
+                        help='never transpile the imported modules named or under PATTERN, '
+                             'their imports are written unchanged')
+    parser.add_argument('--serve', action='store_true',
+                        help='stay running and answer line-delimited JSON requests on stdin/stdout '
+                             '(or --socket), with -j worker processes')
+    parser.add_argument('--socket', type=str, metavar='PATH',
+                        help='with --serve: listen on the Unix socket PATH instead of stdin')
+    parser.add_argument('--traversal', default=RECURSIVE, choices=TRAVERSALS,
+                        help='visit nodes recursively or with an explicit work stack '
+                             '(for deeply nested sources)')
+    parser.add_argument('--profile', action='store_true',
+                        help='time every visit_* handler and print the slowest ones, per handler '
+                             'and per module (single process only)')
+    parser.add_argument('--profile-json', type=str, metavar='PATH',
+                        help='write the --profile results to PATH as JSON (implies --profile)')
+    parser.add_argument('--memory-report', action='store_true',
+                        help='trace allocations and print the peak and retained memory of the parse, '
+                             'visit and save of every module, with the top allocation sites '
+                             '(single process only)')
+    parser.add_argument('--memory-json', type=str, metavar='PATH',
+                        help='write the --memory-report results to PATH as JSON (implies --memory-report)')
+    parser.add_argument('--stats-json', type=str, metavar='PATH',
+                        help='write the statistics of the run and of every module to PATH as JSON: '
+                             'syntax tree nodes by type, source and generated size, phase durations, '
+                             'cache hits and files written')
     args = parser.parse_args()
 
-    with args.infile as infile:
+    if args.ast_cache:
+        from visitors.ast_cache import ASTCache
+        BaseModuleVisitor.ast_cache = ASTCache(args.ast_cache)
+
+    if args.serve:
+        return serve(args)
+    if not args.output:
+        parser.error('the following arguments are required: --output')
+    for path in args.infile + ([args.files_from] if args.files_from else []):
+        if path != '-' and not (os.path.isdir(path) or os.access(path, os.R_OK)):
+            reason = 'permission denied' if os.path.exists(path) else 'no such file or directory'
+            parser.error(f"can't open '{path}': {reason}")
+
+    batch = args.files_from or args.jobs > 1 or args.incremental or args.watch or args.graph \
+        or args.topological or len(args.infile) > 1 or os.path.isdir(args.infile[0])
+    if args.backend != 'python' and batch:
+        parser.error(f'batch mode needs the python backend, not {args.backend}')
+
+    profiler = memory = stats = None
+    if args.profile or args.profile_json:
+        if args.jobs > 1:
+            parser.error('--profile needs a single process, not --jobs %d' % args.jobs)
+        from visitors.profiler import VisitProfiler
+        profiler = BaseModuleVisitor.profiler = VisitProfiler(module=args.infile[0])
+    if args.memory_report or args.memory_json:
+        if args.jobs > 1:
+            parser.error('--memory-report needs a single process, not --jobs %d' % args.jobs)
+        from visitors.memory import MemoryReport
+        memory = MemoryReport()
+        BaseModuleVisitor.observers += (memory,)
+    if args.stats_json:
+        from visitors.stats import RunStats
+        stats = RunStats()
+        BaseModuleVisitor.observers += (stats,)
+    try:
+        if args.backend != 'python':
+            transpile_with_backend(args)
+        elif batch:
+            transpile_batch(args)
+        else:
+            transpile_single(args)
+    finally:
+        if profiler is not None:
+            if args.profile_json:
+                profiler.save(args.profile_json)
+            print(profiler.report())
+        if memory is not None:
+            if args.memory_json:
+                memory.save(args.memory_json)
+            print(memory.report())
+            memory.close()
+        if stats is not None:
+            stats.save(args.stats_json)
+
+
+def finish_run(output):
+    """Hand the output of the run, flushed, to the phase observers"""
+    for observer in BaseModuleVisitor.observers:
+        observer.run_finished(output)
+
+
+def transpile_single(args):
+    """Transpile one module and the modules it imports"""
+    from visitors.python.module_index import ModuleIndex
+    from visitors.python.scope import ImportScope
+
+    path = args.infile[0]
+    infile = sys.stdin.buffer if path == '-' else open(path, 'rb')
+    with infile:
         source = infile.read()
 
-    visitor = PythonVisitor(
+    visitor = get_backend('python')(
         module=os.path.abspath(infile.name),
         result_dir_path=args.output,
-        rebuild_imports_tree=True
+        rebuild_imports_tree=True,
+        stream=True,
+        traversal=args.traversal
     )
+    # resolved like a script: from its directory first, then sys.path
+    module_dir = os.path.dirname(visitor.module)
+    module_index = visitor.import_tree_rebuilder.index = \
+        ModuleIndex([module_dir] + sys.path, snapshot_path=args.index_snapshot)
+    visitor.import_tree_rebuilder.scope = ImportScope.under(module_dir, args.allow_import, args.deny_import)
 
     tree: ast.Module = \
-        visitor.parse(source, args.infile.name, args.mode,
+        visitor.parse(source, infile.name, args.mode,
                       type_comments=args.no_type_comments)
 
     visitor.transpile(
@@ -46,6 +185,105 @@ def main():
         indent=args.indent,
     )
     visitor.save_result_source()
+    output = visitor.import_tree_rebuilder.output
+    output.flush()
+    finish_run(output)
+    module_index.save()
+    print(output.summary().capitalize())
+
+
+def transpile_with_backend(args):
+    """Transpile a single file with a backend generating another language"""
+    from visitors.output import DiskOutput
+
+    path = args.infile[0]
+    infile = sys.stdin.buffer if path == '-' else open(path, 'rb')
+    with infile:
+        source = infile.read()
+
+    visitor_cls = get_backend(args.backend)
+    visitor = visitor_cls(traversal=args.traversal)
+    visitor.module = infile.name
+    tree = visitor.parse(source, infile.name, args.mode, type_comments=args.no_type_comments)
+    visitor.transpile(tree, indent=args.indent)
+
+    module_name = os.path.splitext(os.path.basename(infile.name))[0]
+    target_path = os.path.join(os.path.abspath(args.output), module_name + BACKENDS[args.backend].extension)
+    print(f"Saving results to {target_path}")
+    output = DiskOutput()
+    if visitor.observers:
+        from visitors.phases import SAVE, observe
+        observe(visitor.observers, SAVE, infile.name, visitor, output, output.write, target_path,
+                visitor.sink.getvalue())
+    else:
+        output.write(target_path, visitor.sink.getvalue())
+    finish_run(output)
+
+
+def serve(args):
+    import signal
+    from visitors.python.server import TranspileServer
+
+    # stopped like with Ctrl+C, so that the socket is removed
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    server = TranspileServer(jobs=args.jobs)
+    try:
+        if args.socket:
+            server.serve_socket(args.socket)
+        else:
+            server.serve_stdio()
+    except KeyboardInterrupt:
+        pass
+    except FileExistsError as e:
+        sys.exit(f'--socket: {e}')
+    finally:
+        server.close()
+
+
+def transpile_batch(args):
+    from visitors.ast_cache import MemoryASTCache
+    from visitors.python.batch import BatchTranspiler, collect_modules, common_source_root
+    from visitors.python.module_index import ModuleIndex
+    from visitors.python.scope import ImportScope
+    from visitors.python.watch import Watcher
+
+    paths = [p for p in args.infile if p != '-']
+    modules = collect_modules(paths, args.files_from)
+    source_root = args.source_root or common_source_root(modules if args.files_from else paths) or os.getcwd()
+    module_index = ModuleIndex([os.path.abspath(source_root)] + sys.path, snapshot_path=args.index_snapshot)
+
+    batch = BatchTranspiler(
+        result_dir_path=args.output,
+        source_root=source_root,
+        mode=args.mode,
+        type_comments=args.no_type_comments,
+        indent=args.indent,
+        jobs=args.jobs,
+        module_index=module_index,
+        incremental=args.incremental,
+        scope=ImportScope.under(source_root, args.allow_import, args.deny_import),
+        stream=True,
+        traversal=args.traversal
+    )
+    if args.watch:
+        # unchanged modules importing a changed one are transpiled from memory
+        BaseModuleVisitor.ast_cache = MemoryASTCache(fallback=BaseModuleVisitor.ast_cache)
+        Watcher(batch, paths, args.files_from, interval=args.watch_interval).run()
+        module_index.save()
+        return
+
+    graph = None
+    if args.graph or args.topological:
+        graph = batch.build_graph(modules)
+        if args.graph:
+            graph.save(args.graph)
+
+    batch.transpile(modules, graph)
+    finish_run(batch.import_tree_rebuilder.output)
+    module_index.save()
+    print(batch.summary())
+    if batch.failed:
+        sys.exit(1)
 
 
 if __name__ == '__main__':
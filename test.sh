@@ -1 +1 @@
-python3 main.py sources/func.py
\ No newline at end of file
+python3 -m benchmarks.regression "$@"
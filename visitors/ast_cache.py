@@ -0,0 +1,110 @@
+import hashlib
+import os
+import pickle
+import sys
+from collections import OrderedDict
+from typing import Optional
+
+from _ast import AST
+
+# bump when the layout of the cache directory changes
+CACHE_FORMAT = 1
+
+
+class ASTCache:
+    """
+    Parsed trees pickled into *directory*, keyed by the hash of the source,
+    the Python version and the parse options, so an unchanged file is not
+    tokenized and parsed again on the next run.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = os.path.abspath(directory)
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, source, *options) -> str:
+        if isinstance(source, str):
+            source = source.encode("utf-8", "surrogateescape")
+        digest = hashlib.sha256(source)
+        digest.update(repr((CACHE_FORMAT, sys.version, options)).encode())
+        return digest.hexdigest()
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key[2:] + ".pickle")
+
+    def load(self, key: str) -> Optional[AST]:
+        try:
+            with open(self.path(key), "rb") as f:
+                tree = pickle.load(f)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except Exception:
+            # truncated or written by an incompatible version: parse again
+            self.misses += 1
+            return None
+        self.hits += 1
+        return tree
+
+    def store(self, key: str, tree: AST):
+        path = self.path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tmp_path, "wb") as f:
+                pickle.dump(tree, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+        except (OSError, pickle.PicklingError, RecursionError):
+            # the cache is only an optimization
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+
+class MemoryASTCache(ASTCache):
+    """
+    Keeps the last *maxsize* parsed trees in memory, in front of an
+    optional on-disk cache. Used by long running processes such as the
+    watch mode, where unchanged modules are transpiled again.
+
+    Trees are kept pickled and every load returns a new copy: visitors
+    consume parts of the tree they transpile (see parse_func_args), so
+    a tree must never be handed out twice.
+    """
+
+    def __init__(self, fallback: ASTCache = None, maxsize: int = 4096):
+        self.fallback = fallback
+        self.maxsize = maxsize
+        self.trees: "OrderedDict[str, bytes]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def load(self, key: str) -> Optional[AST]:
+        data = self.trees.get(key)
+        if data is not None:
+            self.trees.move_to_end(key)
+            self.hits += 1
+            return pickle.loads(data)
+        tree = None
+        if self.fallback is not None:
+            tree = self.fallback.load(key)
+        if tree is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._keep(key, tree)
+        return tree
+
+    def store(self, key: str, tree: AST):
+        self._keep(key, tree)
+        if self.fallback is not None:
+            self.fallback.store(key, tree)
+
+    def _keep(self, key: str, tree: AST):
+        try:
+            self.trees[key] = pickle.dumps(tree, protocol=pickle.HIGHEST_PROTOCOL)
+        except (pickle.PicklingError, RecursionError):
+            return
+        self.trees.move_to_end(key)
+        while len(self.trees) > self.maxsize:
+            self.trees.popitem(last=False)
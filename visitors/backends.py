@@ -0,0 +1,53 @@
+from importlib import import_module
+from typing import Dict, List, NamedTuple
+
+
+class Backend(NamedTuple):
+    # module defining the visitor, only imported once the backend is used
+    module: str
+    visitor: str
+    # extension of the generated files
+    extension: str
+
+
+BACKENDS: Dict[str, Backend] = {
+    "python": Backend("visitors.python.python", "PythonVisitor", ".py"),
+    "c": Backend("visitors.c.c", "CVisitor", ".c"),
+    "rust": Backend("visitors.rust.rust", "Pyo3RustVisitor", ".rs"),
+    # visitors.cython holds an empty CythonVisitor, registered once it generates code
+}
+
+_loaded: Dict[str, type] = {}
+
+
+def register_backend(name: str, module: str, visitor: str, extension: str):
+    """Make the visitor class *visitor* of *module* available as backend *name*"""
+    BACKENDS[name] = Backend(module, visitor, extension)
+    _loaded.pop(name, None)
+
+
+def backend_names() -> List[str]:
+    return sorted(BACKENDS)
+
+
+def get_backend(name: str) -> type:
+    """Visitor class of backend *name*, importing its module on first use"""
+    try:
+        return _loaded[name]
+    except KeyError:
+        pass
+    try:
+        backend = BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"unknown backend {name!r}, expected one of {', '.join(backend_names())}") from None
+    visitor_cls = _loaded[name] = getattr(import_module(backend.module), backend.visitor)
+    return visitor_cls
+
+
+def backend_extension(visitor_cls: type) -> str:
+    """Extension of the files generated by *visitor_cls*, or by the registered backend it derives from"""
+    for cls in visitor_cls.__mro__:
+        for backend in BACKENDS.values():
+            if backend.module == cls.__module__ and backend.visitor == cls.__qualname__:
+                return backend.extension
+    raise ValueError(f"{visitor_cls.__qualname__} is not a registered backend")
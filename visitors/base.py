@@ -1,6 +1,36 @@
 import ast
+import sys
+from typing import TYPE_CHECKING, Optional, Tuple
+from weakref import WeakKeyDictionary
 from _ast import AST, PyCF_ONLY_AST, PyCF_TYPE_COMMENTS
 
+from visitors.sink import InstructionSink
+from visitors.writer import CodeWriter
+
+if TYPE_CHECKING:
+    # only imported by the runs using a cache or profiling
+    from visitors.ast_cache import ASTCache
+    from visitors.phases import PhaseObserver
+    from visitors.profiler import VisitProfiler
+
+# traversal engines, see BaseModuleVisitor.traversal
+RECURSIVE = "recursive"
+ITERATIVE = "iterative"
+TRAVERSALS = (RECURSIVE, ITERATIVE)
+
+# the parser builds the tree on the Python stack, deeply nested sources
+# need more than the default limit before any visitor runs
+PARSE_RECURSION_LIMIT = 10000
+
+
+# nodes _assemble() does not descend into
+_ASSEMBLE_SKIP = (ast.stmt, ast.Name, ast.Constant, ast.expr_context,
+                  ast.operator, ast.boolop, ast.unaryop, ast.cmpop)
+
+
+class _Unassembled(Exception):
+    """Raised while assembling expressions when a node has to wait for the normal traversal"""
+
 
 class BaseModuleVisitor(ast.NodeVisitor):
     TAB = " " * 4
@@ -56,7 +86,59 @@ class BaseModuleVisitor(ast.NodeVisitor):
         "class",
     ])
 
-    __instructions = []
+    # only these nodes can carry a docstring
+    docstring_nodes = frozenset([
+        ast.Module,
+        ast.ClassDef,
+        ast.FunctionDef,
+        ast.AsyncFunctionDef,
+    ])
+
+    # node type -> handler, filled per visitor class on first use
+    _dispatch = {}
+    # definition node -> docstring, filled on first request
+    _docstrings = WeakKeyDictionary()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._dispatch = {}
+        cls._docstrings = WeakKeyDictionary()
+
+    # path of the module being transpiled, when known
+    module: Optional[str] = None
+
+    # RECURSIVE visits children on the Python stack, ITERATIVE keeps an
+    # explicit work stack and stays flat on deeply nested sources
+    traversal = RECURSIVE
+    _assemble_skip = _ASSEMBLE_SKIP
+
+    # ASTCache used by parse(), shared by every visitor class when set here
+    ast_cache: Optional['ASTCache'] = None
+    # VisitProfiler timing the handlers of the visitors created while set
+    profiler: Optional['VisitProfiler'] = None
+    # PhaseObservers notified around the parse, visit and save of every module
+    observers: Tuple['PhaseObserver', ...] = ()
+
+    def __init__(self, sink: InstructionSink = None, traversal: str = None):
+        # generated top-level statements of this visitor's module
+        self.sink = sink if sink is not None else InstructionSink()
+        # statement visitors write their lines here
+        self.writer = CodeWriter(self.TAB)
+        if traversal is not None:
+            if traversal not in TRAVERSALS:
+                raise ValueError('unknown traversal %r' % traversal)
+            self.traversal = traversal
+        if self.traversal == ITERATIVE:
+            # blocks reserved by write_block() and waiting to be visited
+            self._deferred = []
+            # expression node -> result, filled bottom-up by _assemble()
+            self._assembled = {}
+            self._assembling = False
+            self.visit = self.visit_iterative
+        if self.profiler is not None:
+            # handlers are looked up in a table of this visitor only, the
+            # class table stays untouched and unprofiled runs pay nothing
+            self._dispatch = self.profiler.dispatch(type(self), self.module)
 
     @staticmethod
     def get_docstring(node, clean=True, default=None):
@@ -84,25 +166,190 @@ class BaseModuleVisitor(ast.NodeVisitor):
             text = inspect.cleandoc(text)
         return text if not default else "%s\n%s" % (default, text)
 
+    def docstring(self, node):
+        """
+        Return the docstring of a definition node prefixed with
+        DEFAULT_MODULE_DOCSTRING, or None. Resolved lazily on first
+        request and remembered in a side table, other nodes are never
+        inspected.
+        """
+        if type(node) not in self.docstring_nodes:
+            return None
+        try:
+            return self._docstrings[node]
+        except KeyError:
+            text = self.get_docstring(node, default=self.DEFAULT_MODULE_DOCSTRING)
+            self._docstrings[node] = text
+            return text
+
     @staticmethod
     def python_symbol(node):
         """Find the equivalent C symbol for a Python ast symbol node"""
         symbol_type = type(node)
         return BaseModuleVisitor.symbols[symbol_type]
 
-    def visit(self, node, level: int = 0):
-        if type(node) in self.symbols:
-            return self.python_symbol(node)
+    @classmethod
+    def resolve_visitor(cls, node_type: type):
+        """
+        Find the handler for *node_type* and remember it in the class
+        dispatch table. Symbol nodes resolve to their symbol string,
+        everything else to the matching ``visit_*`` method or
+        ``generic_visit``.
+        """
+        if node_type in cls.symbols:
+            symbol = cls.symbols[node_type]
+
+            def visitor(self, node, level=0):
+                return symbol
         else:
-            """Visit a node."""
-            method = 'visit_' + node.__class__.__name__
-            visitor = getattr(self, method, self.generic_visit)
+            visitor = getattr(cls, 'visit_' + node_type.__name__, cls.generic_visit)
+        cls._dispatch[node_type] = visitor
+        return visitor
 
-            """Get docstring"""
-            node.docstring = self.get_docstring(
-                node, default=self.DEFAULT_MODULE_DOCSTRING
-            )
-            return visitor(node, level)
+    def visit(self, node, level: int = 0):
+        """Visit a node."""
+        try:
+            visitor = self._dispatch[type(node)]
+        except KeyError:
+            visitor = self.resolve_visitor(type(node))
+        return visitor(self, node, level)
+
+    def visit_iterative(self, node, level: int = 0):
+        """
+        Visit a node without recursing into deeply nested sources.
+        Expressions are assembled bottom-up by _assemble() and statement
+        blocks are deferred by write_block() to the work stack of render().
+        """
+        try:
+            return self._assembled[node]
+        except KeyError:
+            pass
+        try:
+            visitor = self._dispatch[type(node)]
+        except KeyError:
+            visitor = self.resolve_visitor(type(node))
+
+        if self._assembling:
+            # only side-effect free visitors may run ahead of the traversal
+            if visitor is self.__class__.generic_visit or isinstance(node, ast.stmt):
+                raise _Unassembled
+        elif isinstance(node, ast.expr) and not isinstance(node, self._assemble_skip):
+            self._assemble(node, level)
+            try:
+                return self._assembled[node]
+            except KeyError:
+                pass
+        return visitor(self, node, level)
+
+    def _assemble(self, root, level: int):
+        """
+        Visit the expression tree under *root* bottom-up with an explicit
+        stack, so that the visitor of every expression finds the results
+        of its children in self._assembled. Leaves are left to their
+        parents since visiting them cannot recurse.
+        """
+        # pre-order walk, reversed below so children come before parents
+        order = []
+        stack = [root]
+        while stack:
+            node = stack.pop()
+            order.append(node)
+            for field in node._fields:
+                value = getattr(node, field, None)
+                if isinstance(value, list):
+                    stack.extend(item for item in value
+                                 if isinstance(item, AST) and not isinstance(item, self._assemble_skip))
+                elif isinstance(value, AST) and not isinstance(value, self._assemble_skip):
+                    stack.append(value)
+
+        assembled = self._assembled
+        generic_visit = self.__class__.generic_visit
+        self._assembling = True
+        try:
+            for node in reversed(order):
+                if not isinstance(node, ast.expr):
+                    continue
+                try:
+                    visitor = self._dispatch[type(node)]
+                except KeyError:
+                    visitor = self.resolve_visitor(type(node))
+                if visitor is generic_visit:
+                    continue
+                try:
+                    assembled[node] = visitor(self, node, level)
+                except Exception:
+                    # left to the normal traversal, which reports real errors
+                    pass
+        finally:
+            self._assembling = False
+
+    def render(self, node, level: int = 0):
+        """
+        Visit *node* into a fresh CodeWriter and return the generated
+        source, or None if nothing was generated.
+        """
+        writer, self.writer = self.writer, CodeWriter(self.TAB)
+        out = self.writer
+        if self.traversal == ITERATIVE:
+            deferred, self._deferred = self._deferred, []
+        try:
+            result = self.visit(node, level)
+            if result is not None:
+                out.line(0, result)
+            if self.traversal == ITERATIVE:
+                self._assembled.clear()
+                self._visit_deferred()
+            if result is None and not out.segments:
+                return None
+            return out.getvalue()
+        finally:
+            self.writer = writer
+            if self.traversal == ITERATIVE:
+                self._deferred = deferred
+
+    def _visit_deferred(self):
+        """
+        Work stack of the iterative traversal: visit the statements of the
+        blocks reserved by write_block() in the same order the recursive
+        traversal would.
+        """
+        stack = []
+        while True:
+            # blocks of the last statement go first, in the order they were written
+            stack.extend(reversed(self._deferred))
+            self._deferred.clear()
+            if not stack:
+                break
+            body, level, block = stack[-1]
+            stmt = next(body, None)
+            if stmt is None:
+                stack.pop()
+                continue
+            self.writer = block
+            result = self.visit(stmt, level)
+            if result is not None:
+                block.line(0, result)
+            self._assembled.clear()
+
+    def write_block(self, body, level: int, rstrip: bool = False, default: str = None):
+        """
+        Visit block statements into the current writer. Statement visitors
+        either write their lines themselves or return their already
+        indented text. *rstrip* strips trailing whitespace of the block,
+        *default* is written when the block comes out blank.
+        """
+        if self.traversal == ITERATIVE:
+            block = self.writer.block(level, rstrip, default)
+            self._deferred.append((iter(body), level, block))
+            return
+
+        writer = self.writer
+        mark = writer.mark()
+        for stmt in body:
+            result = self.visit(stmt, level)
+            if result is not None:
+                writer.line(0, result)
+        writer.close_block(mark, level, rstrip, default)
 
     def generic_visit(self, node, indent: int, level: int = 0):
         """Called if no explicit visitor function exists for a node."""
@@ -110,7 +357,9 @@ class BaseModuleVisitor(ast.NodeVisitor):
             raise TypeError('expected AST, got %r' % node.__class__.__name__)
 
         def save_visited_instruction(i):
-            self.__instructions.append(self.visit(i, level))
+            instruction = self.render(i, level)
+            if instruction is not None:
+                self.sink.append(instruction)
 
         for field, value in ast.iter_fields(node):
             if isinstance(value, list):
@@ -122,16 +371,29 @@ class BaseModuleVisitor(ast.NodeVisitor):
                 save_visited_instruction(value)
 
     def transpile(self, node: ast.Module, indent=None):
+        if self.observers:
+            from visitors.phases import VISIT, observe
+            return observe(self.observers, VISIT, self.module, self, node,
+                           self.generic_visit, node, indent=indent)
         return self.generic_visit(node, indent=indent)
 
-    @staticmethod
-    def parse(source, filename='<unknown>', mode='exec', *,
+    @classmethod
+    def parse(cls, source, filename='<unknown>', mode='exec', *,
               type_comments=False, feature_version=None):
         """
         Parse the source into an AST node.
         Equivalent to compile(source, filename, mode, PyCF_ONLY_AST).
         Pass type_comments=True to get back type comments where the syntax allows.
+        Trees are loaded from and stored into cls.ast_cache when it is set.
         """
+        if cls.observers:
+            from visitors.phases import PARSE, observe
+            return observe(cls.observers, PARSE, filename, cls, source, cls._parse, source, filename, mode,
+                           type_comments=type_comments, feature_version=feature_version)
+        return cls._parse(source, filename, mode, type_comments=type_comments, feature_version=feature_version)
+
+    @classmethod
+    def _parse(cls, source, filename, mode, *, type_comments, feature_version):
         flags = PyCF_ONLY_AST
         if type_comments:
             flags |= PyCF_TYPE_COMMENTS
@@ -142,5 +404,20 @@ class BaseModuleVisitor(ast.NodeVisitor):
         elif feature_version is None:
             feature_version = -1
         # Else it should be an int giving the minor version for 3.x.
-        return compile(source, filename, mode, flags,
-                       _feature_version=feature_version)
+        cache = cls.ast_cache
+        if cache is not None:
+            key = cache.key(source, mode, flags, feature_version)
+            tree = cache.load(key)
+            if tree is not None:
+                return tree
+
+        recursion_limit = sys.getrecursionlimit()
+        sys.setrecursionlimit(max(recursion_limit, PARSE_RECURSION_LIMIT))
+        try:
+            tree = compile(source, filename, mode, flags,
+                           _feature_version=feature_version)
+            if cache is not None:
+                cache.store(key, tree)
+            return tree
+        finally:
+            sys.setrecursionlimit(recursion_limit)
@@ -40,13 +40,7 @@ class CVisitor(BaseModuleVisitor):
         symbol_type = type(node)
         return CVisitor.symbols[symbol_type]
 
-    def visit(self, node):
-        if type(node) in CVisitor.symbols:
-            return CVisitor.c_symbol(node)
-        else:
-            return super(CVisitor, self).visit(node)
-
-    def visit_Name(self, node):
+    def visit_Name(self, node, level=0):
         if node.id in self.builtin_constants:
             return node.id.lower()
         elif node.id in self.c_keywords:
@@ -56,7 +50,20 @@ class CVisitor(BaseModuleVisitor):
                 return self.c_type_map[node.id]
         return node.id
 
-    def visit_NameConstant(self, node):
+    def visit_Constant(self, node, level=0):
+        # Python 3.8+ parses every literal as Constant
+        value = node.value
+        if value is None or isinstance(value, bool):
+            return self.visit_NameConstant(node, level)
+        elif isinstance(value, (int, float, complex)):
+            return self.visit_Num(node, level)
+        elif isinstance(value, str):
+            return self.visit_Str(node, level)
+        elif isinstance(value, bytes) and hasattr(self, "visit_Bytes"):
+            return self.visit_Bytes(node, level)
+        return repr(value)
+
+    def visit_NameConstant(self, node, level=0):
         if node.value is True:
             return "true"
         elif node.value is False:
@@ -64,46 +71,39 @@ class CVisitor(BaseModuleVisitor):
         else:
             return node.value
 
-    def visit_Num(self, node):
+    def visit_Num(self, node, level=0):
         return str(node.n)
 
-    def visit_Str(self, node):
+    def visit_Str(self, node, level=0):
         return '"{0}"'.format(node.s.replace('"', '\\"'))
 
-    def visit_Return(self, node):
+    def visit_Return(self, node, level=0):
         if node.value:
-            return 'return {0};'.format(self.visit(node.value))
-        return 'return;'
-
-    def visit_If(self, node):
-        buf = []
-        buf.append('if {0} {{'.format(self.visit(node.test)))
-        buf.extend([self.visit(child) for child in node.body])
-
-        orelse = [self.visit(child) for child in node.orelse]
-        if orelse:
-            buf.append('} else {')
-            buf.extend(orelse)
-            buf.append("}")
+            self.writer.line(level, 'return {0};'.format(self.visit(node.value)))
         else:
-            buf.append('}')
+            self.writer.line(level, 'return;')
+
+    def visit_If(self, node, level=0):
+        self.writer.line(level, 'if {0} {{'.format(self.visit(node.test)))
+        self.write_block(node.body, level + 1)
 
-        return '\n'.join(buf)
+        if node.orelse:
+            self.writer.line(level, '} else {')
+            self.write_block(node.orelse, level + 1)
+        self.writer.line(level, '}')
 
-    def visit_Continue(self, node):
-        return "continue;"
+    def visit_Continue(self, node, level=0):
+        self.writer.line(level, "continue;")
 
-    def visit_Break(self, node):
-        return "break;"
+    def visit_Break(self, node, level=0):
+        self.writer.line(level, "break;")
 
-    def visit_While(self, node):
-        buf = []
-        buf.append("while {0} {{".format(self.visit(node.test)))
-        buf.extend([self.visit(n) for n in node.body])
-        buf.append("}")
-        return '\n'.join(buf)
+    def visit_While(self, node, level=0):
+        self.writer.line(level, "while {0} {{".format(self.visit(node.test)))
+        self.write_block(node.body, level + 1)
+        self.writer.line(level, "}")
 
-    def visit_Compare(self, node):
+    def visit_Compare(self, node, level=0):
         left = self.visit(node.left)
         op = self.visit(node.ops[0])
         right = self.visit(node.comparators[0])
@@ -112,11 +112,11 @@ class CVisitor(BaseModuleVisitor):
 
         return "{0} {1} {2}".format(left, op, right)
 
-    def visit_BoolOp(self, node):
+    def visit_BoolOp(self, node, level=0):
         op = self.visit(node.op)
         return op.join([self.visit(v) for v in node.values])
 
-    def visit_BinOp(self, node):
+    def visit_BinOp(self, node, level=0):
         if isinstance(node.op, ast.Pow):
             return "{0}.pow({1})".format(self.visit(node.left),
                                          self.visit(node.right))
@@ -133,11 +133,11 @@ class CVisitor(BaseModuleVisitor):
                                           self.visit(node.op),
                                           self.visit(node.right))
 
-    def visit_UnaryOp(self, node):
+    def visit_UnaryOp(self, node, level=0):
         return "{0}{1}".format(self.visit(node.op), self.visit(node.operand))
 
-    def visit_AugAssign(self, node):
+    def visit_AugAssign(self, node, level=0):
         target = self.visit(node.target)
         op = self.visit(node.op)
         val = self.visit(node.value)
-        return "{0} {1}= {2};".format(target, op, val)
+        self.writer.line(level, "{0} {1}= {2};".format(target, op, val))
@@ -0,0 +1,191 @@
+import json
+import sys
+import tracemalloc
+from typing import Dict, List, Optional
+
+from visitors.phases import PARSE, PHASES, VISIT, PhaseObserver
+
+# allocations of the report itself are left out of the allocation sites
+_FILTERS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, __file__),
+)
+
+
+def deep_size(obj) -> int:
+    """Size in bytes of *obj* and of the containers and strings it holds"""
+    seen = set()
+    size = 0
+    stack = [obj]
+    while stack:
+        item = stack.pop()
+        if id(item) in seen:
+            continue
+        seen.add(id(item))
+        size += sys.getsizeof(item)
+        if isinstance(item, dict):
+            stack.extend(item.keys())
+            stack.extend(item.values())
+        elif isinstance(item, (list, tuple, set, frozenset)):
+            stack.extend(item)
+    return size
+
+
+class MemoryReport(PhaseObserver):
+    """
+    Memory used by the parse, visit and save phases of every module,
+    measured with tracemalloc: the peak above the memory in use when the
+    phase started and what the phase left allocated (retained). Imported
+    modules run inside the visit phase of their importer, whose peak
+    includes theirs.
+
+    The *top* allocation sites are those of the memory the run still
+    holds when reported, compared with a snapshot taken when the first
+    phase started: snapshots walk every traced block, taking them around
+    each phase would cost more than the run itself.
+    """
+
+    def __init__(self, top: int = 10, frames: int = 1):
+        self.top = top
+        self.frames = frames
+        # module -> phase -> {"calls", "peak_bytes", "retained_bytes"}
+        self.modules: Dict[str, Dict[str, dict]] = {}
+        # module -> structure -> bytes, measured at the end of its visit
+        self.structures: Dict[str, Dict[str, int]] = {}
+        # memory traced when the first phase started, see top_sites()
+        self._baseline: Optional[tracemalloc.Snapshot] = None
+        self._sites: Optional[List[dict]] = None
+        # highest memory in use during the phases
+        self.peak_bytes = 0
+        self._stack: List[dict] = []
+        self._visitor_cls: Optional[type] = None
+        self._rebuilder = None
+        self._tracing = False
+
+    def start(self, phase: str, module: str, visitor=None, subject=None):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+            self._tracing = True
+        if self.top and self._baseline is None:
+            self._baseline = tracemalloc.take_snapshot().filter_traces(_FILTERS)
+        current, peak = tracemalloc.get_traced_memory()
+        if self._stack:
+            parent = self._stack[-1]
+            parent["peak"] = max(parent["peak"], peak)
+        tracemalloc.reset_peak()
+        self._stack.append({"before": current, "peak": current})
+
+    def finish(self, phase: str, module: str, visitor=None, error: BaseException = None):
+        entry = self._stack.pop()
+        current, peak = tracemalloc.get_traced_memory()
+        peak = max(entry["peak"], peak)
+        self.peak_bytes = max(self.peak_bytes, peak)
+
+        stats = self.modules.setdefault(module, {}).setdefault(
+            phase, {"calls": 0, "peak_bytes": 0, "retained_bytes": 0})
+        stats["calls"] += 1
+        stats["peak_bytes"] = max(stats["peak_bytes"], peak - entry["before"])
+        stats["retained_bytes"] += current - entry["before"]
+
+        if visitor is not None and phase != PARSE:
+            self._visitor_cls = type(visitor)
+            self._rebuilder = getattr(visitor, "import_tree_rebuilder", self._rebuilder)
+            if phase == VISIT:
+                instructions = getattr(visitor.sink, "instructions", [])
+                self.structures.setdefault(module, {})["instruction_buffer"] = deep_size(instructions)
+
+        tracemalloc.reset_peak()
+        if self._stack:
+            parent = self._stack[-1]
+            parent["peak"] = max(parent["peak"], peak)
+
+    def run_structures(self) -> Dict[str, int]:
+        """Size of the structures kept for the whole run"""
+        sizes = {}
+        rebuilder = self._rebuilder
+        if rebuilder is not None:
+            sizes["module_registry"] = deep_size(rebuilder.registry.states)
+            sizes["rebuilder_modules"] = deep_size((rebuilder.targets, rebuilder.dependencies,
+                                                    rebuilder.source_roots))
+            sizes["module_index"] = deep_size(vars(rebuilder.index))
+            sizes["output_paths"] = deep_size(rebuilder.output.paths)
+        cache = getattr(self._visitor_cls, "ast_cache", None)
+        if cache is not None and hasattr(cache, "trees"):
+            sizes["ast_cache"] = deep_size(cache.trees)
+        return sizes
+
+    def top_sites(self) -> List[dict]:
+        """Lines that allocated the most of the memory still held, taken on first call"""
+        if self._sites is None:
+            self._sites = []
+            if self._baseline is not None and tracemalloc.is_tracing():
+                current = tracemalloc.take_snapshot().filter_traces(_FILTERS)
+                for stat in current.compare_to(self._baseline, "lineno")[:self.top]:
+                    if stat.size_diff <= 0:
+                        break
+                    frame = stat.traceback[0]
+                    self._sites.append({"site": f"{frame.filename}:{frame.lineno}",
+                                        "bytes": stat.size_diff, "allocations": stat.count_diff})
+                self._baseline = None
+        return self._sites
+
+    def module_rows(self) -> List[dict]:
+        """Phases and structures of every module, highest peak first"""
+        rows = []
+        for module, phases in self.modules.items():
+            rows.append({
+                "module": module,
+                "phases": phases,
+                "peak_bytes": max(stats["peak_bytes"] for stats in phases.values()),
+                "retained_bytes": sum(stats["retained_bytes"] for stats in phases.values()),
+                "structures": self.structures.get(module, {}),
+            })
+        return sorted(rows, key=lambda row: -row["peak_bytes"])
+
+    def report(self) -> str:
+        def kib(size: int) -> str:
+            return f"{size / 1024:10.1f}"
+
+        lines = [f"{'module':40} " + " ".join(f"{phase + ' peak':>10}" for phase in PHASES)
+                 + f" {'retained':>10} {'buffer':>10}  (KiB)"]
+        for row in self.module_rows():
+            phases = row["phases"]
+            lines.append(f"{row['module'][-40:]:40} "
+                         + " ".join(kib(phases[phase]["peak_bytes"]) if phase in phases else f"{'-':>10}"
+                                    for phase in PHASES)
+                         + f" {kib(row['retained_bytes'])} {kib(row['structures'].get('instruction_buffer', 0))}")
+        sites = self.top_sites()
+        if sites:
+            lines.append("")
+            lines.append(f"{'held at the end by':50} {'KiB':>10} {'blocks':>8}")
+            for row in sites:
+                site = row["site"]
+                if len(site) > 50:
+                    site = "..." + site[-47:]
+                lines.append(f"{site:50} {kib(row['bytes'])} {row['allocations']:8d}")
+        structures = self.run_structures()
+        if structures:
+            lines.append("")
+            lines.append("kept for the run: " + ", ".join(f"{name} {size / 1024:.1f} KiB"
+                                                          for name, size in structures.items()))
+        lines.append(f"peak: {self.peak_bytes / 2 ** 20:.1f} MiB")
+        return "\n".join(lines)
+
+    def to_json(self) -> dict:
+        return {
+            "peak_bytes": self.peak_bytes,
+            "modules": self.module_rows(),
+            "sites": self.top_sites(),
+            "structures": self.run_structures(),
+        }
+
+    def save(self, path: str):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_json(), f, indent=1)
+            f.write("\n")
+
+    def close(self):
+        """Stop tracing if the report started it"""
+        if self._tracing:
+            tracemalloc.stop()
+            self._tracing = False
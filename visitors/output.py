@@ -0,0 +1,218 @@
+import os
+from abc import ABC, abstractmethod
+from itertools import count
+from typing import Dict, List, Set, TextIO
+
+CHUNK_SIZE = 1 << 16
+
+# numbers the temporary files of the process, a target may be open twice
+_tmp_ids = count()
+
+
+def same_content(path: str, other: str) -> bool:
+    """Whether both files exist and hold the same bytes"""
+    try:
+        if os.path.getsize(path) != os.path.getsize(other):
+            return False
+        with open(path, 'rb') as f, open(other, 'rb') as g:
+            while True:
+                chunk = f.read(CHUNK_SIZE)
+                if chunk != g.read(CHUNK_SIZE):
+                    return False
+                if not chunk:
+                    return True
+    except OSError:
+        return False
+
+
+class AtomicFile:
+    """
+    Text file written next to its target and renamed over it on close, so
+    a target is never seen half written. A target already holding the same
+    content is left alone, with its mtime. discard() drops what was written.
+    """
+
+    def __init__(self, output: 'Output', path: str):
+        self.output = output
+        self.path = path
+        self.tmp_path = f"{path}.{os.getpid()}.{next(_tmp_ids)}.tmp"
+        self._file: TextIO = open(self.tmp_path, 'w', encoding='utf-8')
+
+    def write(self, text: str):
+        self._file.write(text)
+
+    def close(self):
+        if self._file.closed:
+            return
+        self._file.close()
+        if same_content(self.tmp_path, self.path):
+            os.remove(self.tmp_path)
+            self.output.stored(self.path, changed=False)
+            return
+        os.replace(self.tmp_path, self.path)
+        self.output.stored(self.path)
+
+    def discard(self):
+        if self._file.closed:
+            return
+        self._file.close()
+        os.remove(self.tmp_path)
+
+
+class MemoryFile:
+    """Text file of a MemoryOutput, stored on close"""
+
+    def __init__(self, output: 'MemoryOutput', path: str):
+        self.output = output
+        self.path = path
+        self._chunks: List[str] = []
+        self.closed = False
+
+    def write(self, text: str):
+        self._chunks.append(text)
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        self.output.store(self.path, "".join(self._chunks))
+
+    def discard(self):
+        self.closed = True
+
+
+class Output(ABC):
+    """
+    Where the result files of a run go. Package directories are recorded
+    with package() and get their __init__.py on flush(), at the end of a
+    run; files written with the same content they already have are left
+    alone and counted as unchanged.
+    """
+    # whether the savers report every file they write
+    verbose = True
+
+    def __init__(self):
+        # package directories whose __init__.py is created by flush()
+        self._packages: Set[str] = set()
+        self._pending: Set[str] = set()
+        # every file of the run, written or not
+        self.paths: Set[str] = set()
+        self.written = 0
+        # files left as they were, their content did not change
+        self.unchanged = 0
+
+    def package(self, directory: str):
+        """Make *directory* a package, at the latest on flush()"""
+        if directory not in self._packages:
+            self._packages.add(directory)
+            self._pending.add(directory)
+
+    @abstractmethod
+    def open(self, path: str):
+        """File-like object with write(), close() and discard()"""
+
+    @abstractmethod
+    def read(self, path: str) -> str:
+        pass
+
+    def stored(self, path: str, changed: bool = True):
+        self.paths.add(path)
+        if changed:
+            self.written += 1
+        else:
+            self.unchanged += 1
+
+    @abstractmethod
+    def create(self, path: str) -> bool:
+        """Create the empty file *path* unless it exists, True if it did not"""
+
+    def write(self, path: str, text: str):
+        file = self.open(path)
+        try:
+            file.write(text)
+        except BaseException:
+            file.discard()
+            raise
+        file.close()
+
+    def flush(self):
+        """Create the __init__.py files of the packages rebuilt since the last flush"""
+        for directory in sorted(self._pending):
+            # a transpiled __init__.py, or one from an earlier run, is kept
+            path = os.path.join(directory, "__init__.py")
+            if path not in self.paths:
+                self.stored(path, changed=self.create(path))
+        self._pending.clear()
+
+    def relative_to(self, root: str) -> Dict[str, str]:
+        """Content of the files of the run under *root*, by path relative to it"""
+        root = os.path.abspath(root)
+        return {os.path.relpath(path, root): self.read(path) for path in sorted(self.paths)
+                if path.startswith(root + os.sep)}
+
+    def summary(self) -> str:
+        return f"{self.written} files written, {self.unchanged} unchanged"
+
+
+class DiskOutput(Output):
+    """
+    Writes the result files to disk. Each directory is created once per
+    run and every file is written atomically.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._dirs: Set[str] = set()
+
+    def makedirs(self, directory: str):
+        if directory in self._dirs:
+            return
+        os.makedirs(directory, exist_ok=True)
+        while directory not in self._dirs and directory != os.path.dirname(directory):
+            self._dirs.add(directory)
+            directory = os.path.dirname(directory)
+
+    def open(self, path: str) -> AtomicFile:
+        self.makedirs(os.path.dirname(path))
+        return AtomicFile(self, path)
+
+    def read(self, path: str) -> str:
+        with open(path, encoding='utf-8') as f:
+            return f.read()
+
+    def create(self, path: str) -> bool:
+        self.makedirs(os.path.dirname(path))
+        try:
+            open(path, 'x').close()
+        except FileExistsError:
+            return False
+        return True
+
+
+class MemoryOutput(Output):
+    """
+    Keeps the result files in memory, by absolute path, for the library
+    API: nothing is written to disk.
+    """
+    verbose = False
+
+    def __init__(self):
+        super().__init__()
+        self.files: Dict[str, str] = {}
+
+    def open(self, path: str) -> MemoryFile:
+        return MemoryFile(self, path)
+
+    def read(self, path: str) -> str:
+        return self.files[path]
+
+    def store(self, path: str, text: str):
+        changed = self.files.get(path) != text
+        self.files[path] = text
+        self.stored(path, changed)
+
+    def create(self, path: str) -> bool:
+        if path in self.files:
+            return False
+        self.files[path] = ""
+        return True
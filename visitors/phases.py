@@ -0,0 +1,64 @@
+import os
+
+# phases of every module, see BaseModuleVisitor.observers
+PARSE = "parse"
+VISIT = "visit"
+SAVE = "save"
+PHASES = (PARSE, VISIT, SAVE)
+
+
+class PhaseObserver:
+    """
+    Notified around the parse, visit and save phases of every module when
+    registered in BaseModuleVisitor.observers. Phases of imported modules
+    run inside the visit phase of their importer, so calls nest.
+
+    *visitor* is the visitor of the phase, or its class for parse. The
+    *subject* of a phase is the source it parses, the tree it visits or
+    the Output it saves through.
+    """
+
+    def start(self, phase: str, module: str, visitor=None, subject=None):
+        pass
+
+    def finish(self, phase: str, module: str, visitor=None, error: BaseException = None):
+        pass
+
+    def run_finished(self, output):
+        """Called at the end of a run with the Output it wrote through, once flushed"""
+        pass
+
+    def take(self):
+        """
+        Picklable records of what was observed since the last call, sent
+        by batch worker processes to the parent, see merge()
+        """
+        return None
+
+    def merge(self, records):
+        """Add the *records* taken from the observer of a worker process"""
+        pass
+
+
+def module_key(module) -> str:
+    """Name of *module* in reports: its absolute path, or its pseudo name like '<stdin>'"""
+    if not module:
+        return "<unknown>"
+    module = str(module)
+    return module if module.startswith("<") else os.path.abspath(module)
+
+
+def observe(observers, phase: str, module, visitor, subject, func, *args, **kwargs):
+    """Run func(*args, **kwargs) as *phase* of *module* on *subject*, notifying *observers*"""
+    module = module_key(module)
+    for observer in observers:
+        observer.start(phase, module, visitor, subject)
+    try:
+        result = func(*args, **kwargs)
+    except BaseException as e:
+        for observer in reversed(observers):
+            observer.finish(phase, module, visitor, e)
+        raise
+    for observer in reversed(observers):
+        observer.finish(phase, module, visitor)
+    return result
@@ -0,0 +1,135 @@
+import json
+import time
+from typing import Dict, List, Tuple
+
+# (module, handler name) -> [calls, inclusive seconds, exclusive seconds]
+Stats = Dict[Tuple[str, str], List]
+
+
+class _ProfiledDispatch(dict):
+    """Dispatch table of one visitor, resolving handlers into timed wrappers"""
+
+    def __init__(self, profiler: 'VisitProfiler', visitor_cls: type, module: str):
+        super().__init__()
+        self.profiler = profiler
+        self.visitor_cls = visitor_cls
+        self.module = module
+
+    def __missing__(self, node_type: type):
+        visitor_cls = self.visitor_cls
+        try:
+            handler = visitor_cls._dispatch[node_type]
+        except KeyError:
+            handler = visitor_cls.resolve_visitor(node_type)
+        if handler is not visitor_cls.generic_visit:
+            # generic_visit is compared by identity by the iterative
+            # traversal, its time goes to the calling handler
+            name = handler.__name__ if handler.__name__.startswith("visit_") else node_type.__name__
+            handler = self.profiler.wrap(handler, self.module, name)
+        self[node_type] = handler
+        return handler
+
+
+class VisitProfiler:
+    """
+    Counts the calls of every visit_* handler and accumulates their
+    inclusive and exclusive time, per module. Set as
+    BaseModuleVisitor.profiler before the visitors are created: each
+    visitor then dispatches through its own table of timed wrappers, while
+    visitors created without a profiler keep the plain class table.
+    """
+
+    def __init__(self, module: str = "<unknown>"):
+        # name of the module for visitors that do not know their own
+        self.module = module
+        self.stats: Stats = {}
+        # time spent in the handlers called by each running handler
+        self._children: List[float] = []
+        # running calls by key, inclusive time only counts the outermost one
+        self._active: Dict[Tuple[str, str], int] = {}
+
+    def dispatch(self, visitor_cls: type, module: str = None) -> dict:
+        return _ProfiledDispatch(self, visitor_cls, module or self.module)
+
+    def wrap(self, handler, module: str, name: str):
+        key = (module, name)
+        stats = self.stats.setdefault(key, [0, 0.0, 0.0])
+        children = self._children
+        active = self._active
+        clock = time.perf_counter
+
+        def profiled(visitor, node, level=0):
+            children.append(0.0)
+            active[key] = active.get(key, 0) + 1
+            started = clock()
+            try:
+                return handler(visitor, node, level)
+            finally:
+                elapsed = clock() - started
+                child = children.pop()
+                if children:
+                    children[-1] += elapsed
+                active[key] -= 1
+                stats[0] += 1
+                stats[2] += elapsed - child
+                if not active[key]:
+                    stats[1] += elapsed
+
+        return profiled
+
+    def handlers(self) -> List[dict]:
+        """Stats of every handler over all the modules, slowest exclusive time first"""
+        merged: Dict[str, List] = {}
+        for (_, name), (calls, inclusive, exclusive) in self.stats.items():
+            total = merged.setdefault(name, [0, 0.0, 0.0])
+            total[0] += calls
+            total[1] += inclusive
+            total[2] += exclusive
+        rows = [{"handler": name, "calls": calls, "inclusive_s": inclusive, "exclusive_s": exclusive}
+                for name, (calls, inclusive, exclusive) in merged.items()]
+        return sorted(rows, key=lambda row: -row["exclusive_s"])
+
+    def modules(self) -> List[dict]:
+        """Calls and time of the handlers of every module, slowest first"""
+        merged: Dict[str, List] = {}
+        for (module, name), (calls, _, exclusive) in self.stats.items():
+            total = merged.setdefault(module, [0, 0.0, {}])
+            total[0] += calls
+            total[1] += exclusive
+            total[2][name] = total[2].get(name, 0.0) + exclusive
+        rows = [{"module": module, "calls": calls, "time_s": seconds,
+                 "slowest_handler": max(handlers, key=handlers.get)}
+                for module, (calls, seconds, handlers) in merged.items()]
+        return sorted(rows, key=lambda row: -row["time_s"])
+
+    def report(self, top: int = 25) -> str:
+        handlers = self.handlers()
+        total = sum(row["exclusive_s"] for row in handlers)
+        lines = [f"{'handler':28} {'calls':>9} {'inclusive':>10} {'exclusive':>10} {'%':>6}"]
+        for row in handlers[:top]:
+            share = 100 * row["exclusive_s"] / total if total else 0.0
+            lines.append(f"{row['handler']:28} {row['calls']:9d} {row['inclusive_s']:10.4f} "
+                         f"{row['exclusive_s']:10.4f} {share:6.1f}")
+        modules = self.modules()
+        if len(modules) > 1:
+            lines.append("")
+            lines.append(f"{'module':50} {'calls':>9} {'time':>10}  slowest handler")
+            for row in modules[:top]:
+                lines.append(f"{row['module'][-50:]:50} {row['calls']:9d} {row['time_s']:10.4f}  "
+                             f"{row['slowest_handler']}")
+        lines.append(f"total: {total:.4f} s in {sum(row['calls'] for row in handlers)} calls")
+        return "\n".join(lines)
+
+    def to_json(self) -> dict:
+        return {
+            "handlers": self.handlers(),
+            "modules": self.modules(),
+            "calls": [{"module": module, "handler": name, "calls": calls,
+                       "inclusive_s": inclusive, "exclusive_s": exclusive}
+                      for (module, name), (calls, inclusive, exclusive) in sorted(self.stats.items())],
+        }
+
+    def save(self, path: str):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_json(), f, indent=1)
+            f.write("\n")
@@ -1 +1,9 @@
-from .python import PythonVisitor
\ No newline at end of file
+from .python import PythonVisitor
+
+
+def __getattr__(name):
+    # the library API pulls in the batch machinery, only import it when used
+    if name in ("transpile_project", "transpile_source"):
+        from . import api
+        return getattr(api, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,94 @@
+import os
+import sys
+from typing import Dict, Iterable, Union
+
+from visitors.backends import backend_extension, get_backend
+from visitors.output import MemoryOutput, Output
+from visitors.python.batch import BatchTranspiler, collect_modules
+from visitors.python.import_rebuilder import ImportTreeRebuilder
+from visitors.python.module_index import ModuleIndex
+from visitors.python.python import PythonVisitor
+from visitors.python.scope import ImportScope
+
+# result directory of the runs kept in memory, nothing is written there
+MEMORY_RESULT_ROOT = os.path.join(os.sep, "lobster-result")
+
+
+def visitor_class(backend: Union[str, type]) -> type:
+    """Visitor class of *backend*, a visitor class or the name of a registered backend"""
+    if isinstance(backend, str):
+        return get_backend(backend)
+    if not isinstance(backend, type):
+        raise ValueError(f"backend is a visitor class or a backend name, not {backend!r}")
+    return backend
+
+
+def transpile_source(source, backend: Union[str, type] = PythonVisitor, module_name: str = "module.py", source_root: str = None,
+                     output: Output = None, result_dir_path: str = None, mode: str = 'exec',
+                     type_comments: bool = True, indent: int = 4, scope: ImportScope = None,
+                     module_index: ModuleIndex = None, **visitor_options) -> Dict[str, str]:
+    """
+    Transpile *source* as the module *module_name* of *source_root* (the
+    current directory by default) with the visitor class *backend*, or the
+    backend of that name. Returns the generated sources by path relative
+    to the result directory: the module, and for the python backend the
+    imported modules in the scope along with their packages. The other
+    backends transpile the module alone.
+
+    Nothing is written to disk unless *output* is a DiskOutput, in which
+    case the files go to *result_dir_path*. A *module_index* over the
+    source root can be kept between calls.
+    """
+    backend = visitor_class(backend)
+    source_root = os.path.abspath(source_root or os.getcwd())
+    output = output if output is not None else MemoryOutput()
+    result_dir_path = os.path.abspath(result_dir_path or MEMORY_RESULT_ROOT)
+    module = os.path.join(source_root, module_name)
+
+    if not issubclass(backend, PythonVisitor):
+        target_path = os.path.join(result_dir_path, os.path.splitext(module_name)[0] + backend_extension(backend))
+        visitor = backend(**visitor_options)
+        visitor.module = module
+        tree = backend.parse(source, module, mode, type_comments=type_comments)
+        visitor.transpile(tree, indent=indent)
+        output.write(target_path, visitor.sink.getvalue())
+        return output.relative_to(result_dir_path)
+
+    rebuilder = ImportTreeRebuilder(result_dir_path, backend, source_root,
+                                    module_index=module_index or ModuleIndex([source_root] + sys.path),
+                                    scope=scope or ImportScope.under(source_root), output=output,
+                                    source_root=source_root, **visitor_options)
+    rebuilder.registry.claim(module)
+    visitor = backend(module, result_dir_path=result_dir_path, rebuild_imports_tree=True,
+                      source_root=source_root, import_tree_rebuilder=rebuilder, **visitor_options)
+    tree = backend.parse(source, module, mode, type_comments=type_comments)
+    visitor.transpile(tree, indent=indent)
+    visitor.save_result_source()
+    output.flush()
+    return output.relative_to(result_dir_path)
+
+
+def transpile_project(root: str, backend: Union[str, type] = PythonVisitor, modules: Iterable[str] = None, output: Output = None,
+                      result_dir_path: str = None, mode: str = 'exec', type_comments: bool = True,
+                      indent: int = 4, scope: ImportScope = None, **visitor_options) -> Dict[str, str]:
+    """
+    Transpile every module under *root* (or only *modules*) with the
+    visitor class *backend*, a PythonVisitor, or the backend of that name,
+    as a batch whose source root is *root*.
+    Returns the generated sources by path relative to the result directory.
+    Modules failing to transpile are reported on stderr and left out.
+
+    Nothing is written to disk unless *output* is a DiskOutput, in which
+    case the files go to *result_dir_path*.
+    """
+    backend = visitor_class(backend)
+    if not issubclass(backend, PythonVisitor):
+        raise ValueError(f"projects are transpiled with the python backend, not {backend.__qualname__}")
+    root = os.path.abspath(root)
+    output = output if output is not None else MemoryOutput()
+    result_dir_path = os.path.abspath(result_dir_path or MEMORY_RESULT_ROOT)
+
+    batch = BatchTranspiler(result_dir_path, root, visitor_cls=backend, mode=mode, type_comments=type_comments,
+                            indent=indent, scope=scope, output=output, **visitor_options)
+    batch.transpile(collect_modules([root] if modules is None else modules))
+    return output.relative_to(result_dir_path)
@@ -0,0 +1,328 @@
+import ast
+import os
+import sys
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from visitors.output import DiskOutput, Output
+from visitors.python.dependency_graph import DependencyGraph
+from visitors.python.import_rebuilder import DONE, ImportTreeRebuilder
+from visitors.python.manifest import BuildManifest, backend_version
+from visitors.python.module_index import ModuleIndex
+from visitors.python.python import PythonVisitor
+from visitors.python.scope import ImportScope
+
+
+def collect_modules(paths: Iterable[str], files_from: str = None) -> List[str]:
+    """
+    Absolute paths of the modules to transpile: files are taken as they
+    are, directories are walked for *.py files. *files_from* names a file
+    with one path per line ('-' reads them from stdin).
+    """
+    paths = list(paths)
+    if files_from:
+        listing = sys.stdin if files_from == '-' else open(files_from, encoding='utf-8')
+        with listing:
+            paths.extend(line.strip() for line in listing if line.strip())
+
+    modules = []
+    seen = set()
+    for path in paths:
+        path = os.path.abspath(path)
+        if os.path.isdir(path):
+            found = []
+            for dir_path, dir_names, file_names in os.walk(path):
+                dir_names[:] = sorted(d for d in dir_names if d != '__pycache__' and not d.startswith('.'))
+                found.extend(os.path.join(dir_path, f) for f in sorted(file_names) if f.endswith('.py'))
+        else:
+            found = [path]
+        for module in found:
+            if module not in seen:
+                seen.add(module)
+                modules.append(module)
+    return modules
+
+
+def common_source_root(paths: Iterable[str]) -> Optional[str]:
+    """Deepest directory containing every given file or directory"""
+    dirs = [p if os.path.isdir(p) else os.path.dirname(p) for p in map(os.path.abspath, paths)]
+    return os.path.commonpath(dirs) if dirs else None
+
+
+class BatchTranspiler:
+    """
+    Transpiles many modules in one process, or over a pool of *jobs*
+    worker processes. Every module is written under result_dir_path at its
+    path relative to source_root, and all visitors share one
+    ImportTreeRebuilder, so a module already pulled in as an import of an
+    earlier one is not transpiled again.
+
+    With a pool, workers only transpile: the imports they discover are
+    sent back, and the parent alone creates the package directories and
+    schedules the imported modules into the pool.
+    """
+
+    def __init__(self, result_dir_path: str, source_root: str, visitor_cls=PythonVisitor,
+                 mode: str = 'exec', type_comments: bool = True, indent: int = 4, jobs: int = 1,
+                 module_index: ModuleIndex = None, incremental: bool = False, scope: ImportScope = None,
+                 output: Output = None, **visitor_options):
+        if jobs > 1 and output is not None and not isinstance(output, DiskOutput):
+            raise ValueError("worker processes write their results to disk, use one job")
+        self.result_dir_path = result_dir_path
+        self.source_root = os.path.abspath(source_root)
+        self.visitor_cls = visitor_cls
+        self.mode = mode
+        self.type_comments = type_comments
+        self.indent = indent
+        self.jobs = jobs
+        self.visitor_options = visitor_options
+        # the modules of the batch resolve before those of sys.path, as for a script run from source_root
+        module_index = module_index or ModuleIndex([self.source_root] + sys.path)
+        self.import_tree_rebuilder = ImportTreeRebuilder(result_dir_path, visitor_cls, os.path.abspath("sources"),
+                                                         module_index=module_index, scope=scope, output=output,
+                                                         source_root=self.source_root, **visitor_options)
+        if incremental:
+            # a module built with another scope imported other modules
+            version = backend_version(visitor_cls, mode=mode, type_comments=type_comments, indent=indent,
+                                      scope=repr(self.import_tree_rebuilder.scope))
+            self.import_tree_rebuilder.manifest = BuildManifest.in_directory(result_dir_path, version)
+        self.modules = 0
+        self.lines = 0
+        # modules of the batch left as they are, see BuildManifest
+        self.skipped = 0
+        self.failed: List[str] = []
+        self.elapsed = 0.0
+
+    def worker_args(self) -> tuple:
+        """Arguments rebuilding this batch in a worker process, see _init_worker()"""
+        return (self.result_dir_path, self.source_root, self.visitor_cls, self.mode,
+                self.type_comments, self.indent, self.visitor_options, self.visitor_cls.ast_cache,
+                self.visitor_cls.observers)
+
+    def transpile_module(self, module: str) -> int:
+        """Transpile a module of the batch, returns its number of lines"""
+        with self.import_tree_rebuilder.transpiling(module):
+            with open(module, 'rb') as infile:
+                source = infile.read()
+
+            visitor = self.visitor_cls(
+                module=module,
+                result_dir_path=self.result_dir_path,
+                rebuild_imports_tree=True,
+                source_root=self.source_root,
+                import_tree_rebuilder=self.import_tree_rebuilder,
+                **self.visitor_options
+            )
+            tree = self.import_tree_rebuilder.parsed.pop(module, None)
+            if tree is None:
+                tree = visitor.parse(source, module, self.mode, type_comments=self.type_comments)
+            visitor.transpile(tree, indent=self.indent)
+            visitor.save_result_source()
+        return len(source.splitlines())
+
+    def build_graph(self, modules: Iterable[str]) -> DependencyGraph:
+        """
+        Import graph of *modules* and of every module they import, parsed
+        the way they are transpiled. The trees are kept for transpile(),
+        every module is parsed once.
+        """
+        rebuilder = self.import_tree_rebuilder
+
+        def parse(module: str, imported: bool):
+            if imported:
+                with open(module, 'r', encoding='utf-8') as f:
+                    tree = self.visitor_cls.parse(f.read(), filename=module)
+            else:
+                with open(module, 'rb') as f:
+                    tree = self.visitor_cls.parse(f.read(), module, self.mode, type_comments=self.type_comments)
+            rebuilder.parsed[module] = tree
+            return tree
+
+        return DependencyGraph.build(modules, rebuilder.index, parse, rebuilder.scope)
+
+    def transpile(self, modules: Iterable[str], graph: DependencyGraph = None):
+        """
+        Transpile *modules*. With a *graph*, the modules they import are
+        known up front as well, and every module is transpiled after the
+        modules it imports.
+        """
+        started = time.perf_counter()
+        # claimed up front, so that an import never transpiles them first
+        rebuilder = self.import_tree_rebuilder
+        modules = [module for module in modules if rebuilder.registry.claim(module)]
+        # imported module -> source root
+        imported = {}
+        if graph is not None:
+            batch = set(modules)
+            order = graph.topological_order()
+            imported = {path: graph.source_roots[path] for path in order
+                        if path not in batch and rebuilder.registry.claim(path)}
+            modules = [path for path in order if path in batch or path in imported]
+
+        if self.jobs > 1:
+            self.transpile_parallel(modules, imported)
+        else:
+            rebuilder.scheduler = self.transpile_import
+            try:
+                for module in modules:
+                    if self.is_fresh(module, imported=module in imported):
+                        continue
+                    if module in imported:
+                        self.transpile_import(module, imported[module])
+                        continue
+                    try:
+                        self.lines += self.transpile_module(module)
+                        self.modules += 1
+                    except Exception as e:
+                        self.report_failure(module, e)
+            finally:
+                rebuilder.scheduler = None
+        # trees of the modules left up to date or out of the run
+        rebuilder.parsed.clear()
+        rebuilder.output.flush()
+        if rebuilder.manifest:
+            rebuilder.manifest.save()
+        self.elapsed += time.perf_counter() - started
+
+    def is_fresh(self, module: str, imported: bool = False) -> bool:
+        """Skip *module* if the manifest has it up to date"""
+        rebuilder = self.import_tree_rebuilder
+        if rebuilder.manifest and rebuilder.manifest.is_fresh(module):
+            rebuilder.skip_module(module)
+            if not imported:
+                self.skipped += 1
+            return True
+        return False
+
+    def transpile_import(self, module: str, source_root: str = None):
+        """Transpile an imported module; if it fails, the module importing it goes on"""
+        try:
+            self.import_tree_rebuilder.transpile_module(module, source_root)
+        except Exception as e:
+            self.report_failure(module, e)
+
+    def transpile_parallel(self, modules: List[str], imported: Dict[str, Optional[str]] = None):
+        """*imported* maps the imported modules among *modules* to their source root"""
+        # the pool machinery is only imported when a pool is used
+        from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+        rebuilder = self.import_tree_rebuilder
+        imported = imported or {}
+        batch = set(modules).difference(imported)
+        pending = {}
+
+        with ProcessPoolExecutor(self.jobs, initializer=_init_worker, initargs=self.worker_args()) as pool:
+            def schedule(module: str, source_root: str = None, imported: bool = True):
+                rebuilder.registry.start(module)
+                # the tree of the graph pre-pass goes along, the worker does not parse it again
+                future = pool.submit(_transpile_in_worker, module, imported, source_root,
+                                     rebuilder.parsed.pop(module, None))
+                pending[future] = module, source_root
+
+            rebuilder.scheduler = schedule
+            try:
+                for module in modules:
+                    if self.is_fresh(module, imported=module in imported):
+                        continue
+                    if module in imported:
+                        schedule(module, imported[module])
+                    else:
+                        schedule(module, imported=False)
+
+                while pending:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        module, source_root = pending.pop(future)
+                        try:
+                            lines, imports, error, target, paths, written, unchanged, observed = future.result()
+                        except Exception as e:
+                            lines, imports, error, target, paths, written, unchanged, observed = \
+                                0, [], e, None, [], 0, 0, []
+                        # known stored, flush() does not create them again
+                        rebuilder.output.paths.update(paths)
+                        rebuilder.output.written += written
+                        rebuilder.output.unchanged += unchanged
+                        for observer, records in zip(self.visitor_cls.observers, observed):
+                            observer.merge(records)
+                        rebuilder.registry.finish(module, failed=error is not None)
+                        if error is not None:
+                            self.report_failure(module, error)
+                        elif module in batch:
+                            self.modules += 1
+                            self.lines += lines
+                        # package directories are only written from here
+                        rebuilder.dependencies[module] = {}
+                        for name in imports:
+                            rebuilder.rebuild_import(name, importer=module)
+                        if error is None:
+                            rebuilder.targets[module] = target
+                            rebuilder.built(module, source_root)
+                        elif rebuilder.manifest:
+                            rebuilder.manifest.discard(module)
+            finally:
+                rebuilder.scheduler = None
+
+    def report_failure(self, module: str, error: Exception):
+        print(f"Failed to transpile {module}: {error}", file=sys.stderr)
+        self.failed.append(module)
+
+    def summary(self) -> str:
+        imported = len(self.import_tree_rebuilder.registry.with_state(DONE)) - self.modules
+        summary = f"Transpiled {self.modules} modules ({self.lines} lines)"
+        if imported:
+            summary += f" and {imported} imported modules"
+        summary += f" in {self.elapsed:.2f}s"
+        if self.skipped:
+            summary += f", {self.skipped} up to date"
+        if self.failed:
+            summary += f", {len(self.failed)} failed"
+        summary += f"; {self.import_tree_rebuilder.output.summary()}"
+        return summary
+
+
+# BatchTranspiler of a worker process
+_worker_batch: Optional[BatchTranspiler] = None
+
+
+def _init_worker(result_dir_path, source_root, visitor_cls, mode, type_comments, indent, visitor_options,
+                 ast_cache, observers):
+    global _worker_batch
+    visitor_cls.ast_cache = ast_cache
+    visitor_cls.observers = observers
+    for observer in observers:
+        # copies of the parent's observers, only what the worker observes is sent back
+        observer.take()
+    _worker_batch = BatchTranspiler(result_dir_path, source_root, visitor_cls, mode=mode,
+                                    type_comments=type_comments, indent=indent, **visitor_options)
+
+
+def _transpile_in_worker(module: str, imported: bool, source_root: str = None, tree: ast.AST = None) \
+        -> Tuple[int, List[str], Optional[str], Optional[str], List[str], int, int, list]:
+    """
+    Transpile *module* the way the serial run would, either as a module of
+    the batch or as an imported one, from *tree* when it was parsed
+    already. Returns its number of lines, the names
+    of the modules it imports (up to the failure, if any), the error, the
+    file it was written to, the files stored, the number of files written
+    and left unchanged and the records of the phase observers.
+    """
+    rebuilder = _worker_batch.import_tree_rebuilder
+    output = rebuilder.output
+    rebuilder.imports = []
+    output.paths = set()
+    if tree is not None:
+        rebuilder.parsed[module] = tree
+    written, unchanged = output.written, output.unchanged
+    lines, error = 0, None
+    try:
+        if imported:
+            rebuilder.transpile_module(module, source_root)
+        else:
+            lines = _worker_batch.transpile_module(module)
+    except Exception as e:
+        error = str(e)
+    finally:
+        rebuilder.parsed.clear()
+    return (lines, rebuilder.imports, error, rebuilder.targets.get(module), sorted(output.paths),
+            output.written - written, output.unchanged - unchanged,
+            [observer.take() for observer in _worker_batch.visitor_cls.observers])
@@ -0,0 +1,196 @@
+import ast
+import json
+import os
+from typing import Dict, Iterable, List, Optional, Set
+
+from visitors.python.module_index import resolve_relative
+
+
+def imported_names(tree: ast.AST, name: str, is_package: bool) -> List[str]:
+    """
+    Names of the modules imported anywhere in *tree*. For ``from x import y``
+    both x and x.y are returned, since y may be a submodule.
+    """
+    names = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names.extend(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom):
+            names.extend(imported_from(node, name, is_package))
+    return names
+
+
+def imported_from(node: ast.ImportFrom, name: str, is_package: bool) -> List[str]:
+    """
+    Names of the modules ``from x import y`` written in module *name*
+    imports: x, relative levels resolved, and x.y since y may be a
+    submodule
+    """
+    base = node.module
+    if node.level:
+        base = resolve_relative(name, is_package, node.level, node.module)
+    if base is None:
+        return []
+    prefix = f"{base}." if base else ""
+    names = [base] if base else []
+    names.extend(prefix + alias.name for alias in node.names if alias.name != "*")
+    return names
+
+
+class DependencyGraph:
+    """
+    Import graph of a run: every module by path, the modules it imports
+    and, for imported packages, the source root they are written under.
+    """
+
+    def __init__(self):
+        # path -> dotted module name
+        self.modules: Dict[str, str] = {}
+        # path -> paths of the modules it imports
+        self.imports: Dict[str, Set[str]] = {}
+        # path -> source root, see ImportTreeRebuilder.transpile_module()
+        self.source_roots: Dict[str, Optional[str]] = {}
+
+    def __contains__(self, path: str) -> bool:
+        return path in self.modules
+
+    def __len__(self):
+        return len(self.modules)
+
+    def add_module(self, path: str, name: str, source_root: str = None):
+        if path not in self.modules:
+            self.modules[path] = name
+            self.imports[path] = set()
+            self.source_roots[path] = source_root
+
+    def add_import(self, importer: str, imported: str):
+        self.imports[importer].add(imported)
+
+    def importers(self) -> Dict[str, Set[str]]:
+        reverse = {path: set() for path in self.modules}
+        for importer, imports in self.imports.items():
+            for path in imports:
+                reverse.setdefault(path, set()).add(importer)
+        return reverse
+
+    def topological_order(self) -> List[str]:
+        """
+        Modules with their imports first. Modules of an import cycle are
+        kept together, in path order.
+        """
+        # Tarjan's strongly connected components, with an explicit stack
+        index: Dict[str, int] = {}
+        lowlink: Dict[str, int] = {}
+        on_stack: Set[str] = set()
+        stack: List[str] = []
+        order: List[str] = []
+
+        for start in sorted(self.modules):
+            if start in index:
+                continue
+            work = [(start, iter(sorted(self.imports[start])))]
+            index[start] = lowlink[start] = len(index)
+            stack.append(start)
+            on_stack.add(start)
+            while work:
+                path, imports = work[-1]
+                for imported in imports:
+                    if imported not in self.modules:
+                        continue
+                    if imported not in index:
+                        index[imported] = lowlink[imported] = len(index)
+                        stack.append(imported)
+                        on_stack.add(imported)
+                        work.append((imported, iter(sorted(self.imports[imported]))))
+                        break
+                    if imported in on_stack:
+                        lowlink[path] = min(lowlink[path], index[imported])
+                else:
+                    work.pop()
+                    if work:
+                        parent = work[-1][0]
+                        lowlink[parent] = min(lowlink[parent], lowlink[path])
+                    if lowlink[path] == index[path]:
+                        component = []
+                        while True:
+                            member = stack.pop()
+                            on_stack.discard(member)
+                            component.append(member)
+                            if member == path:
+                                break
+                        order.extend(sorted(component))
+        return order
+
+    def to_json(self) -> dict:
+        return {
+            "modules": {
+                path: {
+                    "name": self.modules[path],
+                    "imports": sorted(self.imports[path]),
+                    "source_root": self.source_roots[path],
+                }
+                for path in sorted(self.modules)
+            },
+            "order": self.topological_order(),
+        }
+
+    def to_dot(self) -> str:
+        lines = ["digraph imports {", "    rankdir=LR;"]
+        for path in sorted(self.modules):
+            lines.append(f'    {json.dumps(path)} [label={json.dumps(self.modules[path])}];')
+        for path in sorted(self.modules):
+            for imported in sorted(self.imports[path]):
+                lines.append(f"    {json.dumps(path)} -> {json.dumps(imported)};")
+        lines.append("}")
+        return "\n".join(lines) + "\n"
+
+    def save(self, path: str):
+        """Write the graph as DOT if *path* ends with .dot, as JSON otherwise"""
+        with open(path, "w", encoding="utf-8") as f:
+            if path.endswith(".dot"):
+                f.write(self.to_dot())
+            else:
+                json.dump(self.to_json(), f, indent=1)
+                f.write("\n")
+
+    @classmethod
+    def build(cls, modules: Iterable[str], index, parse, scope=None,
+              follow_imports: bool = True) -> 'DependencyGraph':
+        """
+        Pre-pass building the graph of *modules*: each module is parsed
+        with parse(path, imported) and its imports resolved with the
+        ModuleIndex *index*. Imported modules in the ImportScope *scope*
+        are followed as well unless *follow_imports* is false; the others
+        are neither parsed nor part of the graph.
+        """
+        graph = cls()
+        pending = []
+        for path in modules:
+            graph.add_module(path, index.module_name(path))
+            pending.append((path, False))
+
+        while pending:
+            path, imported = pending.pop()
+            name = graph.modules[path]
+            try:
+                tree = parse(path, imported)
+            except (SyntaxError, ValueError, OSError, UnicodeDecodeError):
+                # reported when the module is transpiled
+                continue
+            is_package = os.path.basename(path).startswith("__init__.")
+            for imported_name in imported_names(tree, name, is_package):
+                location = index.locate(imported_name)
+                if not location or not location.path:
+                    continue
+                if scope is not None and location.path not in graph \
+                        and not scope.includes(imported_name, location.path):
+                    continue
+                if location.path not in graph:
+                    if not follow_imports:
+                        continue
+                    graph.add_module(location.path, imported_name,
+                                     location.root if location.is_package else None)
+                    pending.append((location.path, True))
+                if location.path != path:
+                    graph.add_import(path, location.path)
+        return graph
@@ -1,57 +1,220 @@
 import os
-import sys
 import ast
-from typing import Set
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional
 
-from visitors.python.utils import get_tab
+from visitors.output import DiskOutput, Output
+from visitors.python.dependency_graph import imported_from
+from visitors.python.module_index import ModuleIndex
+from visitors.python.scope import ImportScope
+
+if TYPE_CHECKING:
+    # only imported by incremental runs
+    from visitors.python.manifest import BuildManifest
+
+
+# states of a module in ModuleRegistry
+PENDING = "pending"
+IN_PROGRESS = "in progress"
+DONE = "done"
+FAILED = "failed"
+# up to date from a previous run
+SKIPPED = "skipped"
+
+
+class ModuleRegistry:
+    """
+    State of every module of a run, by absolute path. A module is claimed
+    once, before it is transpiled, so a module imported from many places
+    or through an import cycle is transpiled at most once per run.
+    """
+
+    def __init__(self):
+        self.states: Dict[str, str] = {}
+
+    def __contains__(self, path: str) -> bool:
+        return path in self.states
+
+    def __len__(self):
+        return len(self.states)
+
+    def claim(self, path: str) -> bool:
+        """Register *path* as pending, False if it was already known"""
+        if path in self.states:
+            return False
+        self.states[path] = PENDING
+        return True
+
+    def start(self, path: str):
+        self.states[path] = IN_PROGRESS
+
+    def finish(self, path: str, failed: bool = False):
+        self.states[path] = FAILED if failed else DONE
+
+    def skip(self, path: str):
+        self.states[path] = SKIPPED
+
+    def forget(self, path: str):
+        """Let *path* be claimed again, for modules that changed since"""
+        self.states.pop(path, None)
+
+    @contextmanager
+    def transpiling(self, path: str):
+        """Mark *path* in progress for the duration of the block"""
+        self.start(path)
+        try:
+            yield
+        except BaseException:
+            self.finish(path, failed=True)
+            raise
+        self.finish(path)
+
+    def state(self, path: str) -> Optional[str]:
+        return self.states.get(path)
+
+    def with_state(self, state: str) -> List[str]:
+        return [path for path, s in self.states.items() if s == state]
 
 
 class ImportTreeRebuilder:
-    def __init__(self, result_root: str, visitor_cls, source_base_dir: str):
+    def __init__(self, result_root: str, visitor_cls, source_base_dir: str, module_index: ModuleIndex = None,
+                 scope: ImportScope = None, output: Output = None, **visitor_options):
         self.result_root = os.path.abspath(result_root)
         self.visitor_cls = visitor_cls
         self.source_base_dir = os.path.abspath(source_base_dir)
-        self.cache: Set[str] = set()
+        # module name -> source path, built once for the run
+        self.index = module_index or ModuleIndex()
+        # imported modules transpiled along, the others are left as they are
+        self.scope = scope or ImportScope.under(visitor_options.get("source_root") or self.source_base_dir)
+        # writes the result files of every visitor of the run
+        self.output = output or DiskOutput()
+        # passed on to every visitor spawned for an imported module
+        self.visitor_options = visitor_options
+        # shared by every visitor spawned from this rebuilder
+        self.registry = ModuleRegistry()
+        # set in worker processes: imported module names are collected here
+        # and rebuilt by the parent instead of in place
+        self.imports: Optional[List[str]] = None
+        # when set, called with the path (and source root) of every module
+        # to transpile instead of transpiling it inline
+        self.scheduler: Optional[Callable[[str, Optional[str]], None]] = None
+        # when set, modules still fresh in the manifest are not transpiled again
+        self.manifest: Optional['BuildManifest'] = None
+        # module -> {path of an imported module: its source root}
+        self.dependencies: Dict[str, Dict[str, Optional[str]]] = {}
+        # module -> file it was written to
+        self.targets: Dict[str, str] = {}
+        # module -> source root it was transpiled with, None for the default
+        self.source_roots: Dict[str, Optional[str]] = {}
+        # imported module -> dotted name it was found by
+        self.names: Dict[str, str] = {}
+        # modules being transpiled, innermost last
+        self._transpiling: List[str] = []
+        # module -> tree parsed by the import graph pre-pass, handed once to
+        # its transpilation instead of parsing the module again
+        self.parsed: Dict[str, ast.AST] = {}
 
-    def rebuild_import(self, module_path: str, alias_name: str = None):
-        parts = module_path.split(".")
-        current_path = self.result_root
+    def rebuild_import(self, module_path: str, alias_name: str = None, importer: str = None):
+        if self.imports is not None:
+            self.imports.append(module_path)
+            return
+
+        location = self.index.locate(module_path)
+        if not location or not self.scope.includes(module_path, location.path):
+            return
+        self.rebuild_package(module_path)
+        if not location.path:
+            return
+        self.names.setdefault(location.path, module_path)
+        # a package is written into the package directory rebuilt above
+        source_root = location.root if location.is_package else None
+        importer = importer or (self._transpiling[-1] if self._transpiling else None)
+        if importer:
+            self.dependencies.setdefault(importer, {})[location.path] = source_root
+        self.submit(location.path, source_root)
+
+    def submit(self, abs_path: str, source_root: str = None):
+        """Transpile or schedule a module, unless it is already known in this run"""
+        if not self.registry.claim(abs_path):
+            return
+        if self.manifest and self.manifest.is_fresh(abs_path):
+            self.skip_module(abs_path)
+        elif self.scheduler:
+            self.scheduler(abs_path, source_root)
+        else:
+            self.transpile_module(abs_path, source_root)
+
+    def skip_module(self, abs_path: str):
+        """Keep the output of a fresh module, but check the modules it imports"""
+        self.registry.skip(abs_path)
+        for path, source_root in self.manifest.imports(abs_path):
+            self.submit(path, source_root)
+
+    @contextmanager
+    def transpiling(self, abs_path: str, source_root: str = None):
+        """Track the imports of *abs_path* while it is transpiled and record it in the manifest"""
+        self._transpiling.append(abs_path)
+        self.dependencies[abs_path] = {}
+        self.source_roots[abs_path] = source_root
+        try:
+            with self.registry.transpiling(abs_path):
+                yield
+        except BaseException:
+            if self.manifest:
+                self.manifest.discard(abs_path)
+            raise
+        finally:
+            self._transpiling.pop()
+        self.built(abs_path, source_root)
 
-        for part in parts:
+    def built(self, abs_path: str, source_root: str = None):
+        if self.manifest and abs_path in self.targets:
+            self.manifest.record(abs_path, self.targets[abs_path], self.dependencies.get(abs_path, {}), source_root)
+
+    def rebuild_package(self, module_path: str):
+        """Create the package directories of *module_path* in the result root"""
+        current_path = self.result_root
+        for part in module_path.split("."):
             current_path = os.path.join(current_path, part)
-            os.makedirs(current_path, exist_ok=True)
-            init_path = os.path.join(current_path, "__init__.py")
-            if not os.path.exists(init_path):
-                open(init_path, 'a').close()
-
-        mod_file = module_path.replace('.', os.sep) + ".py"
-        for path in sys.path:
-            candidate = os.path.join(path, mod_file)
-            if os.path.exists(candidate):
-                if candidate not in self.cache:
-                    self.cache.add(candidate)
-                    self.transpile_module(candidate)
-                break
-
-    def transpile_module(self, abs_path):
-        with open(abs_path, "r", encoding="utf-8") as f:
-            tree = ast.parse(f.read(), filename=abs_path)
-        visitor = self.visitor_cls(abs_path, result_dir_path=self.result_root, rebuild_imports_tree=True)
-        visitor.source_base_dir = self.source_base_dir  # ensure correct base path
-        visitor.transpile(tree)
-        visitor.save_result_source()
-
-    def rewrite_import_from(self, node: ast.ImportFrom, level: int = 0) -> str:
-        module = node.module
-        if module:
-            self.rebuild_import(module)
-            names = ", ".join([alias.name for alias in node.names])
-            return f"{get_tab('    ', level)}from {module} import {names}"
-        return ""
-
-    def rewrite_import(self, node: ast.Import, level: int = 0) -> str:
-        rewritten = []
-        for alias in node.names:
-            self.rebuild_import(alias.name)
-            rewritten.append(alias.name)
-        return f"{get_tab('    ', level)}import {', '.join(rewritten)}"
\ No newline at end of file
+            self.output.package(current_path)
+
+    def find_module(self, module_path: str) -> Optional[str]:
+        return self.index.find(module_path)
+
+    def transpile_module(self, abs_path, source_root: str = None):
+        options = self.visitor_options
+        if source_root:
+            options = dict(options, source_root=source_root)
+        with self.transpiling(abs_path, source_root):
+            tree = self.parsed.pop(abs_path, None)
+            if tree is None:
+                with open(abs_path, "r", encoding="utf-8") as f:
+                    tree = self.visitor_cls.parse(f.read(), filename=abs_path)
+            visitor = self.visitor_cls(abs_path, result_dir_path=self.result_root, rebuild_imports_tree=True,
+                                       import_tree_rebuilder=self, **options)
+            visitor.source_base_dir = self.source_base_dir  # ensure correct base path
+            visitor.transpile(tree)
+            visitor.save_result_source()
+
+    def module_name(self, abs_path: str) -> str:
+        """Dotted name of *abs_path*, the one the import graph gives it"""
+        name = self.names.get(abs_path)
+        return name if name is not None else self.index.module_name(abs_path)
+
+    def rebuild_imports(self, node):
+        """
+        Rebuild the modules an Import or ImportFrom *node* names, those in
+        the scope; the statement itself is emitted unchanged. Relative
+        imports are resolved against the module being transpiled.
+        """
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                self.rebuild_import(alias.name)
+            return
+        if node.level and not self._transpiling:
+            return
+        importer = self._transpiling[-1] if node.level else ""
+        is_package = os.path.basename(importer).startswith("__init__.")
+        name = self.module_name(importer) if node.level else ""
+        for module_path in imported_from(node, name, is_package):
+            self.rebuild_import(module_path)
@@ -0,0 +1,140 @@
+import hashlib
+import json
+import os
+import sys
+from typing import Dict, List, Optional, Tuple
+
+MANIFEST_NAME = ".lobster-manifest.json"
+MANIFEST_VERSION = 1
+
+
+def file_hash(path: str) -> Optional[str]:
+    try:
+        with open(path, 'rb') as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    except OSError:
+        return None
+
+
+# directory of the visitors package, and its modules shaping the output of every backend
+VISITORS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CORE_MODULES = ("base.py", "writer.py", "sink.py")
+
+
+def backend_files(visitor_cls) -> List[str]:
+    """
+    Source files of the backend of *visitor_cls*, found on disk: the
+    core modules and every file of the packages of the visitor classes
+    it derives from. The set does not depend on what was imported.
+    """
+    files = {os.path.join(VISITORS_DIR, name) for name in CORE_MODULES}
+    for cls in visitor_cls.__mro__:
+        path = getattr(sys.modules.get(cls.__module__), "__file__", None)
+        if not path:
+            continue
+        path = os.path.abspath(path)
+        directory = os.path.dirname(path)
+        if directory == VISITORS_DIR or not directory.startswith(VISITORS_DIR + os.sep):
+            # a visitor defined elsewhere counts by its own module only
+            if cls is visitor_cls and path.endswith(".py"):
+                files.add(path)
+            continue
+        for dir_path, dir_names, file_names in os.walk(directory):
+            dir_names[:] = [name for name in dir_names if name != "__pycache__"]
+            files.update(os.path.join(dir_path, name) for name in file_names if name.endswith(".py"))
+    return sorted(files)
+
+
+def backend_version(visitor_cls, **options) -> str:
+    """
+    Version of the code generating a module: the visitor class, the
+    sources of its backend (see backend_files()) and the options changing
+    its output.
+    """
+    digest = hashlib.sha256()
+    for path in backend_files(visitor_cls):
+        name = os.path.relpath(path, VISITORS_DIR) if path.startswith(VISITORS_DIR + os.sep) else path
+        digest.update(name.replace(os.sep, "/").encode())
+        digest.update((file_hash(path) or "").encode())
+    digest.update(repr(sorted(options.items())).encode())
+    return f"{visitor_cls.__qualname__}-{digest.hexdigest()[:16]}"
+
+
+class BuildManifest:
+    """
+    Record of the last build in the output directory: per module, the hash
+    of its source, the backend version, the hashes of the modules it
+    imports and the file it was written to. A module is fresh, and is not
+    transpiled again, while all of them are unchanged.
+    """
+
+    def __init__(self, path: str, version: str):
+        self.path = path
+        self.version = version
+        # module -> {"hash", "version", "imports": {path: [hash, source root]}, "target", "source_root"}
+        self.entries: Dict[str, dict] = {}
+        self._hashes: Dict[str, Optional[str]] = {}
+        self.load()
+
+    @classmethod
+    def in_directory(cls, result_dir: str, version: str) -> 'BuildManifest':
+        return cls(os.path.join(os.path.abspath(result_dir), MANIFEST_NAME), version)
+
+    def hash(self, path: str) -> Optional[str]:
+        """Source hash of *path*, computed once per run"""
+        try:
+            return self._hashes[path]
+        except KeyError:
+            digest = self._hashes[path] = file_hash(path)
+            return digest
+
+    def invalidate(self, paths):
+        """Hash *paths* again, they changed since they were hashed"""
+        for path in paths:
+            self._hashes.pop(path, None)
+
+    def is_fresh(self, module: str) -> bool:
+        entry = self.entries.get(module)
+        if entry is None or entry["version"] != self.version:
+            return False
+        if entry["hash"] != self.hash(module) or not os.path.exists(entry["target"]):
+            return False
+        return all(self.hash(path) == digest for path, (digest, _) in entry["imports"].items())
+
+    def imports(self, module: str) -> List[Tuple[str, Optional[str]]]:
+        """(path, source root) of the modules *module* imported when it was built"""
+        entry = self.entries.get(module)
+        return [(path, source_root) for path, (_, source_root) in entry["imports"].items()] if entry else []
+
+    def source_root(self, module: str) -> Optional[str]:
+        entry = self.entries.get(module)
+        return entry["source_root"] if entry else None
+
+    def record(self, module: str, target: str, imports: Dict[str, Optional[str]], source_root: str = None):
+        """*imports* maps the path of every imported module to its source root"""
+        self.entries[module] = {
+            "hash": self.hash(module),
+            "version": self.version,
+            "imports": {path: [self.hash(path), root] for path, root in imports.items()},
+            "target": target,
+            "source_root": source_root,
+        }
+
+    def discard(self, module: str):
+        self.entries.pop(module, None)
+
+    def load(self):
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return
+        if manifest.get("version") == MANIFEST_VERSION:
+            self.entries = manifest["modules"]
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"version": MANIFEST_VERSION, "modules": self.entries}, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.path)
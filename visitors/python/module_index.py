@@ -0,0 +1,216 @@
+import json
+import os
+import sys
+from importlib.machinery import EXTENSION_SUFFIXES, BuiltinImporter, FrozenImporter, PathFinder
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+SNAPSHOT_VERSION = 1
+
+
+def resolve_relative(name: str, is_package: bool, level: int, module: Optional[str]) -> Optional[str]:
+    """
+    Absolute name of ``from <level dots><module> import ...`` written in
+    module *name*: "" for the top level of the search roots, None when it
+    goes above it
+    """
+    package = name.split(".") if is_package else name.split(".")[:-1]
+    if level - 1 > len(package):
+        return None
+    if level > 1:
+        package = package[:len(package) - (level - 1)]
+    if module:
+        package = package + module.split(".")
+    return ".".join(package)
+
+
+class ModuleLocation(NamedTuple):
+    # source file to transpile, None for namespace packages and extensions
+    path: Optional[str]
+    # search root the top-level package was found in
+    root: Optional[str]
+    # directories of a package, empty for plain modules
+    search_locations: Tuple[str, ...] = ()
+
+    @property
+    def is_package(self) -> bool:
+        return bool(self.search_locations)
+
+
+class ModuleIndex:
+    """
+    Module name -> source path index over the search roots (sys.path by
+    default), resolving like the path based import system: regular
+    packages (pkg/__init__.py), modules, namespace packages and, when no
+    source exists, .pyi stubs.
+
+    Each directory is listed once per run with os.scandir instead of
+    calling os.path.exists for every import on every root. The listings
+    can be kept in a snapshot file; on the next run a listing is reused
+    as long as the mtime of its directory did not change.
+    """
+
+    def __init__(self, search_path: List[str] = None, snapshot_path: str = None):
+        if search_path is None:
+            search_path = sys.path
+        self.search_path = [os.path.abspath(path) for path in search_path if os.path.isdir(path or ".")]
+        self.snapshot_path = snapshot_path
+        # directory -> (mtime_ns, {entry name: is directory})
+        self._listings: Dict[str, Tuple[Optional[int], Dict[str, bool]]] = {}
+        # listings checked against the file system during this run
+        self._checked = set()
+        self._locations: Dict[str, Optional[ModuleLocation]] = {}
+        self.dirty = False
+        if snapshot_path:
+            self.load(snapshot_path)
+
+    def listing(self, directory: str) -> Dict[str, bool]:
+        if directory in self._checked:
+            return self._listings[directory][1]
+        self._checked.add(directory)
+
+        try:
+            mtime = os.stat(directory).st_mtime_ns
+        except OSError:
+            mtime = None
+        cached = self._listings.get(directory)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+
+        names = {}
+        if mtime is not None:
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        names[entry.name] = entry.is_dir()
+            except OSError:
+                pass
+        self._listings[directory] = (mtime, names)
+        self.dirty = True
+        return names
+
+    def refresh(self):
+        """Check the listings against the file system again, for long running processes"""
+        self._checked.clear()
+        self._locations.clear()
+
+    def module_name(self, path: str) -> str:
+        """
+        Dotted name of the module at *path*, relative to the first search
+        root holding it, the name locate() finds it by. Outside of the
+        search roots, the name goes up the enclosing packages.
+        """
+        path = os.path.abspath(path)
+        directory, file_name = os.path.split(path)
+        stem = file_name.split(".", 1)[0]
+        parts = [] if stem == "__init__" else [stem]
+        for root in self.search_path:
+            if directory == root or directory.startswith(root.rstrip(os.sep) + os.sep):
+                relative = os.path.relpath(directory, root)
+                packages = [] if relative == os.curdir else relative.split(os.sep)
+                return ".".join(packages + parts)
+        while os.path.exists(os.path.join(directory, "__init__.py")):
+            directory, package = os.path.split(directory)
+            parts.insert(0, package)
+        return ".".join(parts)
+
+    def find(self, name: str) -> Optional[str]:
+        """Source file of module *name*, or None"""
+        location = self.locate(name)
+        return location.path if location else None
+
+    def locate(self, name: str) -> Optional[ModuleLocation]:
+        try:
+            return self._locations[name]
+        except KeyError:
+            pass
+
+        parent, _, last = name.rpartition(".")
+        if parent:
+            package = self.locate(parent)
+            location = self._locate(last, package.search_locations, package.root) \
+                if package and package.is_package else None
+        else:
+            location = self._locate(last, self.search_path)
+        if location is None:
+            location = self._find_with_finders(name, parent)
+        self._locations[name] = location
+        return location
+
+    def _locate(self, name: str, directories, root: str = None) -> Optional[ModuleLocation]:
+        portions = []
+        stub = None
+        for directory in directories:
+            names = self.listing(directory)
+            if names.get(name):
+                package_dir = os.path.join(directory, name)
+                inner = self.listing(package_dir)
+                if "__init__.py" in inner:
+                    return ModuleLocation(os.path.join(package_dir, "__init__.py"), root or directory,
+                                          (package_dir,))
+                if "__init__.pyi" in inner:
+                    stub = stub or ModuleLocation(os.path.join(package_dir, "__init__.pyi"), root or directory,
+                                                  (package_dir,))
+                else:
+                    portions.append(package_dir)
+            if name + ".py" in names:
+                return ModuleLocation(os.path.join(directory, name + ".py"), root or directory)
+            if any(name + suffix in names for suffix in EXTENSION_SUFFIXES):
+                return ModuleLocation(None, root or directory)
+            if name + ".pyi" in names:
+                stub = stub or ModuleLocation(os.path.join(directory, name + ".pyi"), root or directory)
+        if stub:
+            return stub
+        if portions:
+            return ModuleLocation(None, root or os.path.dirname(portions[0]), tuple(portions))
+        return None
+
+    @staticmethod
+    def _find_with_finders(name: str, parent: str) -> Optional[ModuleLocation]:
+        """Ask the custom meta path finders, which the index does not cover"""
+        if parent:
+            # submodules of packages found by a finder are not indexed
+            return None
+        for finder in sys.meta_path:
+            if finder in (BuiltinImporter, FrozenImporter, PathFinder):
+                continue
+            find_spec = getattr(finder, "find_spec", None)
+            if find_spec is None:
+                continue
+            try:
+                spec = find_spec(name, None)
+            except Exception:
+                continue
+            if spec is None:
+                continue
+            origin = spec.origin if spec.has_location else None
+            if origin and not origin.endswith((".py", ".pyi")):
+                origin = None
+            return ModuleLocation(origin, None, tuple(spec.submodule_search_locations or ()))
+        return None
+
+    def load(self, path: str):
+        try:
+            with open(path, encoding="utf-8") as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError):
+            return
+        if snapshot.get("version") != SNAPSHOT_VERSION or snapshot.get("search_path") != self.search_path:
+            return
+        self._listings = {directory: (mtime, names) for directory, (mtime, names) in snapshot["listings"].items()}
+
+    def save(self, path: str = None):
+        """Write the listings to the snapshot file if any of them changed"""
+        path = path or self.snapshot_path
+        if not path or not self.dirty:
+            return
+        snapshot = {
+            "version": SNAPSHOT_VERSION,
+            "search_path": self.search_path,
+            "listings": self._listings,
+        }
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(snapshot, f)
+        os.replace(tmp_path, path)
+        self.dirty = False
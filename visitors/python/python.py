@@ -1,11 +1,11 @@
 import ast
 import os
-from typing import List
-
 from visitors.base import BaseModuleVisitor
+from visitors.output import DiskOutput, Output
+from visitors.sink import InstructionSink, StreamingInstructionSink
 from visitors.python.import_rebuilder import ImportTreeRebuilder
+from visitors.python.scope import ImportScope
 from visitors.python.utils import (
-    get_tab,
     parse_func_body,
     parse_func_args,
     remove_indent_level,
@@ -24,103 +24,134 @@ class PythonModuleSaver:
                  module_path: str,
                  source_base_dir: str,
                  result_dir_name: str,
-                 instructions: List[str]):
+                 instructions: InstructionSink,
+                 output: Output = None):
         self.module = module_path
         self.source_base_dir = source_base_dir
         self.result_dir_path = os.path.abspath(result_dir_name)
-        self.instructions: List[str] = instructions
+        self.instructions: InstructionSink = instructions
+        self.output = output or DiskOutput()
 
-    def save(self):
-        os.system(f"mkdir result")
+    @property
+    def target_path(self) -> str:
         rel_path = os.path.relpath(self.module, start=self.source_base_dir)
-        target_path = os.path.join(self.result_dir_path, rel_path)
-        os.makedirs(os.path.dirname(target_path), exist_ok=True)
-        print(f"Saving results to {target_path}")
-        with open(target_path, 'w', encoding='utf-8') as source_file:
-            try:
-                source_file.write("\n\n".join(self.instructions))
-            except TypeError as e:
-                exit(e)
+        return os.path.join(self.result_dir_path, rel_path)
+
+    def save(self):
+        target_path = self.target_path
+        if self.output.verbose:
+            print(f"Saving results to {target_path}")
+        if isinstance(self.instructions, StreamingInstructionSink):
+            # already written while transpiling
+            self.instructions.close()
+            return
+        try:
+            source = self.instructions.getvalue()
+        except TypeError as e:
+            exit(e)
+        self.output.write(target_path, source)
 
 
 class PythonVisitor(BaseModuleVisitor):
-    def __init__(self, module: str, result_dir_path: str = None, rebuild_imports_tree: bool = False):
+    def __init__(self, module: str, result_dir_path: str = None, rebuild_imports_tree: bool = False,
+                 stream: bool = False, traversal: str = None, source_root: str = None,
+                 import_tree_rebuilder: ImportTreeRebuilder = None):
         module_name = module.split("/")[-1]
         self.source_base_dir = os.path.abspath("sources")
         self.module = module
         self.module_name = module_name
         self.source_module_dir = "/".join(module.split("/")[:-1])
+        # modules under source_root keep their relative path in the result dir
+        self.source_root = os.path.abspath(source_root) if source_root else None
         self.result_dir_name = 'result' \
             if not result_dir_path else result_dir_path
         self.rebuild_imports_tree = rebuild_imports_tree
-        self.import_tree_rebuilder = ImportTreeRebuilder(self.result_dir_name, self.__class__, self.source_base_dir)
-
-    def save_result_source(self, saver: PythonModuleSaver = None):
-        saver: PythonModuleSaver = PythonModuleSaver(
+        self.stream = stream
+        if import_tree_rebuilder is None:
+            # first visitor of the run: the rebuilder is shared by every
+            # visitor spawned for its imports
+            scope = ImportScope.under(self.source_root or self.source_module_dir)
+            import_tree_rebuilder = ImportTreeRebuilder(self.result_dir_name, self.__class__, self.source_base_dir,
+                                                        scope=scope, stream=stream, traversal=traversal)
+            import_tree_rebuilder.registry.claim(os.path.abspath(module))
+        self.import_tree_rebuilder = import_tree_rebuilder
+        super().__init__(traversal=traversal)
+        if stream:
+            self.sink = StreamingInstructionSink(self.saver().target_path, self.import_tree_rebuilder.output)
+
+    def saver(self) -> PythonModuleSaver:
+        source_base_dir = self.source_module_dir
+        if self.source_root and os.path.abspath(self.module).startswith(self.source_root + os.sep):
+            source_base_dir = self.source_root
+        return PythonModuleSaver(
             module_path=self.module,
-            source_base_dir=self.source_module_dir,
+            source_base_dir=source_base_dir,
             result_dir_name=self.result_dir_name,
-            instructions=self._BaseModuleVisitor__instructions
+            instructions=self.sink,
+            output=self.import_tree_rebuilder.output
         )
-        saver.save()
+
+    def save_result_source(self, saver: PythonModuleSaver = None):
+        saver: PythonModuleSaver = saver or self.saver()
+        if self.observers:
+            from visitors.phases import SAVE, observe
+            observe(self.observers, SAVE, self.module, self, saver.output, saver.save)
+        else:
+            saver.save()
+        self.import_tree_rebuilder.targets[os.path.abspath(self.module)] = saver.target_path
+
+    def transpile(self, node: ast.Module, indent=None):
+        try:
+            return super().transpile(node, indent=indent)
+        except BaseException:
+            self.sink.discard()
+            raise
 
     def visit_Module(self, node: ast.Module, level: int = 0):
         lines = []
         for stmt in node.body:
-            result = self.visit(stmt, level)
+            result = self.render(stmt, level)
             if result:
                 lines.append(result)
         return "\n\n".join(lines)
 
     def visit_Ellipsis(self, node: ast.Ellipsis, level: int):
-        return f"{get_tab(self.TAB, level)}..."
+        return f"{self.writer.indent(level)}..."
 
     def visit_FunctionDef(self, node: ast.FunctionDef, level: int = 0):
         decorators, _ = parse_decorators_list(node, level)
-        decorators_str = "\n".join([f"{get_tab(self.TAB, level)}{d}" for d in decorators])
+        for d in decorators:
+            self.writer.line(level, d)
 
         args_str = parse_func_args(self, node, level)
         returns = f" -> {self.visit(node.returns, level)}" if node.returns else ""
 
-        body_indent = add_indent_level(level)
-        body_str, _ = parse_func_body(self, node, body_indent)
-
-        func_def_line = f"{get_tab(self.TAB, level)}def {node.name}({args_str}){returns}:"
-        full_body = f"{func_def_line}\n{body_str}"
-
-        return f"{decorators_str}\n{full_body}" if decorators else full_body
+        self.writer.line(level, f"def {node.name}({args_str}){returns}:")
+        parse_func_body(self, node, add_indent_level(level))
 
     def visit_AsyncFunctionDef(self, node: ast.AsyncFunctionDef, level: int = 0):
         decorators, _ = parse_decorators_list(node, level)
-        decorators_str = "\n".join([f"{get_tab(self.TAB, level)}{d}" for d in decorators])
+        for d in decorators:
+            self.writer.line(level, d)
 
         args_str = parse_func_args(self, node, level)
         returns = f" -> {self.visit(node.returns, level)}" if node.returns else ""
 
-        body_indent = add_indent_level(level)
-        body_str, _ = parse_func_body(self, node, body_indent)
-
-        func_def_line = f"{get_tab(self.TAB, level)}async def {node.name}({args_str}){returns}:"
-        full_body = f"{func_def_line}\n{body_str}"
-
-        return f"{decorators_str}\n{full_body}" if decorators else full_body
+        self.writer.line(level, f"async def {node.name}({args_str}){returns}:")
+        parse_func_body(self, node, add_indent_level(level))
 
     def visit_ClassDef(self, node: ast.ClassDef, level: int = 0):
         bases = ", ".join([self.visit(base, level) for base in node.bases])
-        class_header = f"{get_tab(self.TAB, level)}class {node.name}({bases}):" if bases else f"{get_tab(self.TAB, level)}class {node.name}:"
-
-        body_level = add_indent_level(level)
-        body = "\n".join([self.visit(stmt, body_level) for stmt in node.body])
-        if not body.strip():
-            body = f"{get_tab(self.TAB, body_level)}pass"
+        self.writer.line(level, f"class {node.name}({bases}):" if bases else f"class {node.name}:")
 
-        return f"{class_header}\n{body}"
+        self.write_block(node.body, add_indent_level(level), default="pass")
 
     def visit_Expr(self, node: ast.Expr, level: int):
         value = node.value
         if isinstance(value, ast.Constant) and value.value is Ellipsis:
-            return f"{get_tab(self.TAB, level)}..."
-        return f"{get_tab(self.TAB, level)}{self.visit(value, level)}"
+            self.writer.line(level, "...")
+        else:
+            self.writer.line(level, self.visit(value, level))
 
     def visit_Call(self, node: ast.Call, level: int):
         func = self.visit(node.func, level)
@@ -135,73 +166,69 @@ class PythonVisitor(BaseModuleVisitor):
 
     def visit_Return(self, node: ast.Return, level: int):
         value = self.visit(node.value, level) if node.value else ""
-        return f"{get_tab(self.TAB, level)}return {value}"
+        self.writer.line(level, f"return {value}")
 
     def visit_Assign(self, node: ast.Assign, level: int):
         targets = " = ".join([self.visit(t, level) for t in node.targets])
         value = self.visit(node.value, level)
-        return f"{get_tab(self.TAB, level)}{targets} = {value}"
+        self.writer.line(level, f"{targets} = {value}")
 
     def visit_Import(self, node: ast.Import, level: int):
         if self.rebuild_imports_tree:
-            return self.import_tree_rebuilder.rewrite_import(node, level)
-        names = ", ".join([alias.name for alias in node.names])
-        return f"{get_tab(self.TAB, level)}import {names}"
+            self.import_tree_rebuilder.rebuild_imports(node)
+        # aliases kept, whether the imported modules are rebuilt or not
+        self.writer.line(level, ast.unparse(node))
 
     def visit_ImportFrom(self, node: ast.ImportFrom, level: int):
-        if self.rebuild_imports_tree and node.module:
-            return self.import_tree_rebuilder.rewrite_import_from(node, level)
-        module = node.module or ""
-        names = ", ".join([alias.name for alias in node.names])
-        return f"{get_tab(self.TAB, level)}from {module} import {names}"
+        if self.rebuild_imports_tree:
+            self.import_tree_rebuilder.rebuild_imports(node)
+        # aliases and relative levels kept
+        self.writer.line(level, ast.unparse(node))
 
     def visit_If(self, node: ast.If, level: int):
         test = self.visit(node.test, level)
-        body = "\n".join([self.visit(stmt, add_indent_level(level)) for stmt in node.body])
-        result = f"{get_tab(self.TAB, level)}if {test}:\n{body}"
+        self.writer.line(level, f"if {test}:")
+        self.write_block(node.body, add_indent_level(level))
         if node.orelse:
-            orelse = "\n".join([self.visit(stmt, add_indent_level(level)) for stmt in node.orelse])
-            result += f"\n{get_tab(self.TAB, level)}else:\n{orelse}"
-        return result
+            self.writer.line(level, "else:")
+            self.write_block(node.orelse, add_indent_level(level))
 
     def visit_While(self, node: ast.While, level: int):
         test = self.visit(node.test, level)
-        body = "\n".join([self.visit(stmt, add_indent_level(level)) for stmt in node.body])
-        return f"{get_tab(self.TAB, level)}while {test}:\n{body}"
+        self.writer.line(level, f"while {test}:")
+        self.write_block(node.body, add_indent_level(level))
 
     def visit_For(self, node: ast.For, level: int):
         target = self.visit(node.target, level)
         iter_ = self.visit(node.iter, level)
-        body = "\n".join([self.visit(stmt, add_indent_level(level)) for stmt in node.body])
-        return f"{get_tab(self.TAB, level)}for {target} in {iter_}:\n{body}"
+        self.writer.line(level, f"for {target} in {iter_}:")
+        self.write_block(node.body, add_indent_level(level))
 
     def visit_Break(self, node: ast.Break, level: int):
-        return f"{get_tab(self.TAB, level)}break"
+        self.writer.line(level, "break")
 
     def visit_Continue(self, node: ast.Continue, level: int):
-        return f"{get_tab(self.TAB, level)}continue"
+        self.writer.line(level, "continue")
 
     def visit_Pass(self, node: ast.Pass, level: int):
-        return f"{get_tab(self.TAB, level)}pass"
+        self.writer.line(level, "pass")
 
     def visit_Try(self, node: ast.Try, level: int):
-        body = "\n".join([self.visit(stmt, add_indent_level(level)) for stmt in node.body])
-        result = f"{get_tab(self.TAB, level)}try:\n{body}"
-        for handler in node.handlers:
-            result += f"\n{self.visit(handler, level)}"
+        self.writer.line(level, "try:")
+        self.write_block(node.body, add_indent_level(level))
+        self.write_block(node.handlers, level)
         if node.orelse:
-            orelse = "\n".join([self.visit(stmt, add_indent_level(level)) for stmt in node.orelse])
-            result += f"\n{get_tab(self.TAB, level)}else:\n{orelse}"
+            self.writer.line(level, "else:")
+            self.write_block(node.orelse, add_indent_level(level))
         if node.finalbody:
-            finalbody = "\n".join([self.visit(stmt, add_indent_level(level)) for stmt in node.finalbody])
-            result += f"\n{get_tab(self.TAB, level)}finally:\n{finalbody}"
-        return result
+            self.writer.line(level, "finally:")
+            self.write_block(node.finalbody, add_indent_level(level))
 
     def visit_ExceptHandler(self, node: ast.ExceptHandler, level: int):
         type_ = self.visit(node.type, level) if node.type else ""
         name = f" as {node.name}" if node.name else ""
-        body = "\n".join([self.visit(stmt, add_indent_level(level)) for stmt in node.body])
-        return f"{get_tab(self.TAB, level)}except {type_}{name}:\n{body}"
+        self.writer.line(level, f"except {type_}{name}:")
+        self.write_block(node.body, add_indent_level(level))
 
     def visit_With(self, node: ast.With, level: int):
         items = ", ".join([
@@ -209,8 +236,8 @@ class PythonVisitor(BaseModuleVisitor):
             if item.optional_vars else self.visit(item.context_expr, level)
             for item in node.items
         ])
-        body = "\n".join([self.visit(stmt, add_indent_level(level)) for stmt in node.body])
-        return f"{get_tab(self.TAB, level)}with {items}:\n{body}"
+        self.writer.line(level, f"with {items}:")
+        self.write_block(node.body, add_indent_level(level))
 
     def visit_BinOp(self, node: ast.BinOp, level: int):
         left = self.visit(node.left, level)
@@ -280,13 +307,13 @@ class PythonVisitor(BaseModuleVisitor):
         target = self.visit(node.target, level)
         op = self.visit(node.op, level)
         value = self.visit(node.value, level)
-        return f"{get_tab(self.TAB, level)}{target} {op}= {value}"
+        self.writer.line(level, f"{target} {op}= {value}")
 
     def visit_AnnAssign(self, node: ast.AnnAssign, level: int):
         target = self.visit(node.target, level)
         annotation = self.visit(node.annotation, level)
         value = f" = {self.visit(node.value, level)}" if node.value else ""
-        return f"{get_tab(self.TAB, level)}{target}: {annotation}{value}"
+        self.writer.line(level, f"{target}: {annotation}{value}")
 
     def visit_Await(self, node: ast.Await, level: int):
         value = self.visit(node.value, level)
@@ -295,13 +322,13 @@ class PythonVisitor(BaseModuleVisitor):
     def visit_Assert(self, node: ast.Assert, level: int):
         test = self.visit(node.test, level)
         msg = f", {self.visit(node.msg, level)}" if node.msg else ""
-        return f"{get_tab(self.TAB, level)}assert {test}{msg}"
+        self.writer.line(level, f"assert {test}{msg}")
 
     def visit_AsyncFor(self, node: ast.AsyncFor, level: int):
         target = self.visit(node.target, level)
         iter_ = self.visit(node.iter, level)
-        body = "\n".join([self.visit(stmt, add_indent_level(level)) for stmt in node.body])
-        return f"{get_tab(self.TAB, level)}async for {target} in {iter_}:{body}"
+        self.writer.line(level, f"async for {target} in {iter_}:")
+        self.write_block(node.body, add_indent_level(level))
 
     def visit_AsyncWith(self, node: ast.AsyncWith, level: int):
         items = ", ".join([
@@ -309,8 +336,8 @@ class PythonVisitor(BaseModuleVisitor):
             if item.optional_vars else self.visit(item.context_expr, level)
             for item in node.items
         ])
-        body = "\n".join([self.visit(stmt, add_indent_level(level)) for stmt in node.body])
-        return f"{get_tab(self.TAB, level)}async with {items}:{body}"
+        self.writer.line(level, f"async with {items}:")
+        self.write_block(node.body, add_indent_level(level))
 
     def visit_DictComp(self, node: ast.DictComp, level: int):
         key = self.visit(node.key, level)
@@ -431,15 +458,15 @@ class PythonVisitor(BaseModuleVisitor):
     def visit_Raise(self, node: ast.Raise, level: int):
         exc = self.visit(node.exc, level) if node.exc else ""
         cause = f" from {self.visit(node.cause, level)}" if node.cause else ""
-        return f"{get_tab(self.TAB, level)}raise {exc}{cause}"
+        self.writer.line(level, f"raise {exc}{cause}")
 
     def visit_Global(self, node: ast.Global, level: int):
         names = ", ".join(node.names)
-        return f"{get_tab(self.TAB, level)}global {names}"
+        self.writer.line(level, f"global {names}")
 
     def visit_Nonlocal(self, node: ast.Nonlocal, level: int):
         names = ", ".join(node.names)
-        return f"{get_tab(self.TAB, level)}nonlocal {names}"
+        self.writer.line(level, f"nonlocal {names}")
 
     def visit_List(self, node: ast.List, level: int):
         elts = ", ".join([self.visit(e, level) for e in node.elts])
@@ -475,14 +502,14 @@ class PythonVisitor(BaseModuleVisitor):
 
     def visit_Match(self, node: ast.Match, level: int):
         subject = self.visit(node.subject, level)
-        cases = "\n".join([self.visit(c, level) for c in node.cases])
-        return f"{get_tab(self.TAB, level)}match {subject}:{cases}"
+        self.writer.line(level, f"match {subject}:")
+        self.write_block(node.cases, level)
 
     def visit_match_case(self, node: ast.match_case, level: int):
         pattern = self.visit(node.pattern, level)
         guard = f" if {self.visit(node.guard, level)}" if node.guard else ""
-        body = "\n".join([self.visit(stmt, add_indent_level(level)) for stmt in node.body])
-        return f"{get_tab(self.TAB, level)}case {pattern}{guard}:{body}"
+        self.writer.line(level, f"case {pattern}{guard}:")
+        self.write_block(node.body, add_indent_level(level))
 
     def visit_MatchValue(self, node: ast.MatchValue, level: int):
         return self.visit(node.value, level)
@@ -0,0 +1,57 @@
+import os
+from fnmatch import fnmatchcase
+from typing import Iterable, Optional
+
+
+class ImportScope:
+    """
+    Which imported modules are transpiled along with the modules importing
+    them. Imports out of the scope are written unchanged, and the modules
+    they name are never parsed nor copied into the result directory.
+
+    Entries of *allow* and *deny* are either directories, for the modules
+    whose source is under them, or module names with fnmatch wildcards,
+    for the modules and their submodules ("numpy", "django.*", "*"). An
+    entry containing a path separator is a directory. Deny wins over allow.
+    """
+
+    def __init__(self, allow: Iterable[str] = (), deny: Iterable[str] = ()):
+        self.allow_dirs, self.allow_names = self._split(allow)
+        self.deny_dirs, self.deny_names = self._split(deny)
+
+    @classmethod
+    def under(cls, source_root: str, allow: Iterable[str] = (), deny: Iterable[str] = ()) -> 'ImportScope':
+        """Default scope: the modules under *source_root*, plus *allow*"""
+        return cls([os.path.abspath(source_root), *allow], deny)
+
+    @staticmethod
+    def _split(entries: Iterable[str]):
+        dirs, names = [], []
+        for entry in entries:
+            if os.sep in entry or entry in (".", ".."):
+                dirs.append(os.path.abspath(entry))
+            else:
+                names.append(entry)
+        return tuple(dirs), tuple(names)
+
+    @staticmethod
+    def _under(path: Optional[str], dirs) -> bool:
+        return path is not None and any(path.startswith(d + os.sep) for d in dirs)
+
+    @staticmethod
+    def _named(name: Optional[str], patterns) -> bool:
+        if not name:
+            return False
+        parts = name.split(".")
+        prefixes = [".".join(parts[:i]) for i in range(1, len(parts) + 1)]
+        return any(fnmatchcase(prefix, pattern) for pattern in patterns for prefix in prefixes)
+
+    def includes(self, name: Optional[str], path: Optional[str]) -> bool:
+        """Whether module *name*, found at *path*, is transpiled"""
+        if self._under(path, self.deny_dirs) or self._named(name, self.deny_names):
+            return False
+        return self._under(path, self.allow_dirs) or self._named(name, self.allow_names)
+
+    def __repr__(self):
+        return (f"{self.__class__.__name__}(allow={list(self.allow_dirs + self.allow_names)!r}, "
+                f"deny={list(self.deny_dirs + self.deny_names)!r})")
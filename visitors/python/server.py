@@ -0,0 +1,173 @@
+import errno
+import json
+import os
+import socketserver
+import stat
+import sys
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Dict, TextIO
+
+from visitors.ast_cache import MemoryASTCache
+from visitors.base import BaseModuleVisitor
+from visitors.python.api import transpile_source
+from visitors.python.module_index import ModuleIndex
+
+# module indexes of the process, by source root, kept between requests
+_indexes: Dict[str, ModuleIndex] = {}
+
+
+def _init_worker(ast_cache):
+    # parsed trees are kept in memory between requests
+    BaseModuleVisitor.ast_cache = MemoryASTCache(fallback=ast_cache)
+
+
+def _module_index(source_root: str) -> ModuleIndex:
+    index = _indexes.get(source_root)
+    if index is None:
+        index = _indexes[source_root] = ModuleIndex([source_root] + sys.path)
+    else:
+        # listings are checked again, and only listed again if they changed
+        index.refresh()
+    return index
+
+
+def _diagnostic(error: Exception) -> dict:
+    if isinstance(error, SyntaxError):
+        return {"severity": "error", "message": error.msg, "line": error.lineno, "column": error.offset}
+    return {"severity": "error", "message": f"{error.__class__.__name__}: {error}"}
+
+
+def handle_request(request: dict) -> dict:
+    """
+    Answer one request. A request holds the "source" to transpile and
+    optionally its "module_name", "source_root", "mode", "type_comments"
+    and "indent"; the response holds the generated "files" by relative
+    path and the "diagnostics". {"command": "ping"} checks the server is up.
+    """
+    response = {"id": request.get("id")}
+    if request.get("command") == "ping":
+        response["ok"] = True
+        return response
+    if not isinstance(request.get("source"), str):
+        response.update(ok=False, files={}, diagnostics=[{"severity": "error", "message": "missing 'source'"}])
+        return response
+
+    source_root = os.path.abspath(request.get("source_root") or os.getcwd())
+    try:
+        files = transpile_source(
+            request["source"],
+            module_name=request.get("module_name", "module.py"),
+            source_root=source_root,
+            mode=request.get("mode", "exec"),
+            type_comments=request.get("type_comments", True),
+            indent=request.get("indent", 4),
+            module_index=_module_index(source_root),
+        )
+    except Exception as e:
+        response.update(ok=False, files={}, diagnostics=[_diagnostic(e)])
+        return response
+    response.update(ok=True, files=files, diagnostics=[])
+    return response
+
+
+class TranspileServer:
+    """
+    Answers line-delimited JSON requests (see handle_request()) on
+    stdin/stdout or on a Unix socket, one response line per request, in
+    the order they complete. Interpreter startup, imports, module indexes
+    and parsed trees are paid once for all the requests.
+
+    With *jobs* > 1 requests are answered by a pool of worker processes,
+    each keeping its own caches warm, so concurrent clients do not wait
+    for each other. With one job they are answered in this process, one
+    at a time: the module indexes and the tree cache are not thread-safe.
+    """
+
+    def __init__(self, jobs: int = 1):
+        self.jobs = jobs
+        self.pool = None
+        # serializes the requests of the socket client threads when there is no pool
+        self._lock = threading.Lock()
+        if jobs > 1:
+            self.pool = ProcessPoolExecutor(jobs, initializer=_init_worker,
+                                            initargs=(BaseModuleVisitor.ast_cache,))
+        else:
+            _init_worker(BaseModuleVisitor.ast_cache)
+
+    def submit(self, line: str) -> Future:
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError("a request is a JSON object")
+        except ValueError as e:
+            future = Future()
+            future.set_result({"id": None, "ok": False, "files": {},
+                               "diagnostics": [{"severity": "error", "message": f"invalid request: {e}"}]})
+            return future
+        if self.pool is not None:
+            return self.pool.submit(handle_request, request)
+        future = Future()
+        with self._lock:
+            future.set_result(handle_request(request))
+        return future
+
+    def serve(self, infile: TextIO, write):
+        """Answer every request line of *infile* with write(response line)"""
+        lock = threading.Lock()
+        pending = []
+
+        def respond(future: Future):
+            try:
+                response = future.result()
+            except Exception as e:
+                response = {"id": None, "ok": False, "files": {}, "diagnostics": [_diagnostic(e)]}
+            with lock:
+                write(json.dumps(response) + "\n")
+
+        for line in infile:
+            if isinstance(line, bytes):
+                line = line.decode("utf-8")
+            if not line.strip():
+                continue
+            future = self.submit(line)
+            future.add_done_callback(respond)
+            pending.append(future)
+            pending = [f for f in pending if not f.done()]
+        for future in pending:
+            future.exception()
+
+    def serve_stdio(self, infile: TextIO = None, outfile: TextIO = None):
+        outfile = outfile or sys.stdout
+
+        def write(text: str):
+            outfile.write(text)
+            outfile.flush()
+
+        self.serve(infile or sys.stdin, write)
+
+    def serve_socket(self, path: str):
+        server = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                server.serve(self.rfile, lambda text: self.wfile.write(text.encode("utf-8")))
+
+        try:
+            mode = os.lstat(path).st_mode
+        except FileNotFoundError:
+            pass
+        else:
+            # left by a server that did not stop cleanly; anything else may be a source file
+            if not stat.S_ISSOCK(mode):
+                raise FileExistsError(errno.EEXIST, "not a socket, refusing to replace it", path)
+            os.remove(path)
+        with socketserver.ThreadingUnixStreamServer(path, Handler) as unix_server:
+            try:
+                unix_server.serve_forever()
+            finally:
+                os.remove(path)
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
@@ -19,13 +19,6 @@ const_node_type_names = {
 }
 
 
-def get_tab(tab: str, level: int, inner=False):
-    calc_tab = tab * level
-    return "{tabulation}".format(
-        tabulation=calc_tab
-    )
-
-
 def get_constant_type(node: ast.Constant) -> type:
     value = node.value
     type_name = const_node_type_names.get(type(value))
@@ -86,12 +79,7 @@ def parse_decorators_list(node: ast.FunctionDef, level: int):
 
 
 def parse_func_body(visitor: BaseModuleVisitor, node: ast.FunctionDef, level: int = 0):
-    body = ""
-    for element in node.body:
-        # Общий случай — применяем отступ к любой строке
-        line = visitor.visit(element, level)
-        body += f"{line}\n"
-    return body.rstrip(), level
+    visitor.write_block(node.body, level, rstrip=True)
 
 
 def parse_func_args(visitor: BaseModuleVisitor, node: ast.FunctionDef, level: int = 0):
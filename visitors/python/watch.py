@@ -0,0 +1,141 @@
+import os
+import time
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from visitors.python.batch import BatchTranspiler, collect_modules
+
+try:
+    from inotify_simple import INotify, flags
+except ImportError:
+    INotify = None
+
+WATCH_FLAGS = ("CLOSE_WRITE", "MOVED_TO", "MOVED_FROM", "CREATE", "DELETE")
+
+
+def _stat(path: str) -> Optional[Tuple[int, int]]:
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+class Watcher:
+    """
+    Keeps a BatchTranspiler alive and transpiles again the modules that
+    changed on disk, plus the modules importing them. The registry, the
+    import graph, the module index and the parsed trees (see
+    MemoryASTCache) stay in memory between two rounds.
+
+    Changes are found by comparing mtimes every *interval* seconds, or as
+    soon as inotify reports an event when inotify_simple is installed.
+    """
+
+    def __init__(self, batch: BatchTranspiler, paths: Iterable[str], files_from: str = None,
+                 interval: float = 0.1):
+        self.batch = batch
+        self.paths = list(paths)
+        self.files_from = files_from
+        self.interval = interval
+        self.modules: Set[str] = set()
+        self._stats: Dict[str, Optional[Tuple[int, int]]] = {}
+        self._inotify = INotify() if INotify is not None else None
+        self._watched_dirs: Set[str] = set()
+
+    def watched(self) -> Set[str]:
+        """Modules of the batch and every module they imported"""
+        return self.modules | set(self.batch.import_tree_rebuilder.registry.states)
+
+    def snapshot(self):
+        self._stats = {path: _stat(path) for path in self.watched()}
+        if self._inotify is not None:
+            self._watch_dirs()
+
+    def _watch_dirs(self):
+        dirs = {os.path.dirname(path) for path in self._stats}
+        dirs.update(os.path.abspath(path) for path in self.paths if os.path.isdir(path))
+        mask = 0
+        for name in WATCH_FLAGS:
+            mask |= getattr(flags, name)
+        for directory in dirs - self._watched_dirs:
+            try:
+                self._inotify.add_watch(directory, mask)
+            except OSError:
+                continue
+            self._watched_dirs.add(directory)
+
+    def wait(self):
+        if self._inotify is None:
+            time.sleep(self.interval)
+            return
+        if self._inotify.read(timeout=int(self.interval * 1000)):
+            # let the editor finish writing before looking at the files
+            time.sleep(0.01)
+            self._inotify.read(timeout=0)
+
+    def changes(self) -> List[str]:
+        modules = set(collect_modules(self.paths, self.files_from))
+        added = modules - self.modules
+        self.modules = modules
+        changed = [path for path, stat in self._stats.items() if _stat(path) != stat]
+        return sorted(added.union(changed))
+
+    def rebuild(self, changed: List[str]) -> List[str]:
+        """Transpile *changed* and the modules importing them again, returns them"""
+        batch = self.batch
+        rebuilder = batch.import_tree_rebuilder
+        importers: Dict[str, Set[str]] = {}
+        for importer, imports in rebuilder.dependencies.items():
+            for path in imports:
+                importers.setdefault(path, set()).add(importer)
+
+        affected = set(changed)
+        for path in changed:
+            affected.update(importers.get(path, ()))
+
+        rebuilder.index.refresh()
+        if rebuilder.manifest:
+            rebuilder.manifest.invalidate(affected)
+        for path in affected:
+            rebuilder.registry.forget(path)
+
+        # claimed up front, so that each is transpiled the way it was before
+        rebuilt = [path for path in sorted(affected) if os.path.exists(path) and rebuilder.registry.claim(path)]
+        rebuilder.scheduler = batch.transpile_import
+        try:
+            for path in rebuilt:
+                if path in self.modules:
+                    try:
+                        batch.transpile_module(path)
+                    except Exception as e:
+                        batch.report_failure(path, e)
+                else:
+                    batch.transpile_import(path, rebuilder.source_roots.get(path))
+        finally:
+            rebuilder.scheduler = None
+        rebuilder.output.flush()
+        if rebuilder.manifest:
+            rebuilder.manifest.save()
+        return rebuilt
+
+    def run(self):
+        self.modules = set(collect_modules(self.paths, self.files_from))
+        self.batch.transpile(sorted(self.modules))
+        print(self.batch.summary())
+        self.snapshot()
+        print("Watching for changes, press Ctrl+C to stop")
+
+        try:
+            while True:
+                self.wait()
+                changed = self.changes()
+                if not changed:
+                    continue
+                started = time.perf_counter()
+                rebuilt = self.rebuild(changed)
+                self.snapshot()
+                elapsed = (time.perf_counter() - started) * 1000
+                print(f"Transpiled {len(rebuilt)} modules in {elapsed:.0f}ms "
+                      f"({len(changed)} changed)")
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,285 @@
+import ast
+from typing import Dict, FrozenSet, Iterator, Optional, Set
+
+# nodes whose definitions are not visible outside of them, like the
+# blocks the Rust backend emits for them
+SCOPE_NODES = (ast.Module, ast.ClassDef, ast.FunctionDef, ast.AsyncFunctionDef, ast.Lambda,
+               ast.If, ast.For, ast.AsyncFor, ast.While, ast.With, ast.AsyncWith)
+# scopes an assignment binds a new local name in, the other scopes
+# rebind the names of their enclosing one
+OWNER_NODES = (ast.Module, ast.ClassDef, ast.FunctionDef, ast.AsyncFunctionDef, ast.Lambda)
+FUNCTION_NODES = (ast.FunctionDef, ast.AsyncFunctionDef)
+# nodes whose scope emission asks for
+_TRACKED = (ast.stmt, ast.Name, ast.Attribute)
+
+# methods changing the object they are called on, its binding must be `mut`
+MUTATING_METHODS = frozenset([
+    "append", "extend", "insert", "pop", "remove", "clear", "sort", "reverse",
+    "update", "add", "discard", "setdefault", "popitem",
+])
+
+_EMPTY = frozenset()
+
+
+def target_names(target: ast.AST) -> Iterator[ast.Name]:
+    """Names bound by an assignment *target*, unpacking included"""
+    if isinstance(target, ast.Name):
+        yield target
+    elif isinstance(target, (ast.Tuple, ast.List)):
+        for elt in target.elts:
+            yield from target_names(elt)
+    elif isinstance(target, ast.Starred):
+        yield from target_names(target.value)
+
+
+def base_name(node: ast.AST) -> Optional[ast.Name]:
+    """Name an attribute or subscript chain like ``a.b[0].c`` starts from"""
+    while isinstance(node, (ast.Attribute, ast.Subscript)):
+        node = node.value
+    return node if isinstance(node, ast.Name) else None
+
+
+class ScopeAnalysis:
+    """
+    Scopes, definitions, mutability, if-branch common variables, void-ness
+    and recursion of a module, gathered in one traversal before the Rust
+    backend emits it. Results live in side tables keyed by node, emission
+    looks them up instead of walking subtrees again.
+    """
+
+    def __init__(self, tree: ast.AST = None):
+        # statement, Name and Attribute node -> innermost scope holding it
+        self.scopes: Dict[ast.AST, ast.AST] = {}
+        # scope -> enclosing scope, None for the module
+        self.parents: Dict[ast.AST, Optional[ast.AST]] = {}
+        # scope -> name -> node first binding it: Name target, arg,
+        # definition or import alias
+        self.definitions: Dict[ast.AST, Dict[str, ast.AST]] = {}
+        # Name targets binding a name already defined, emitted without `let`
+        self.reassigned: Set[ast.AST] = set()
+        # definitions rebound, augmented, mutated through a subscript,
+        # an attribute or a mutating method
+        self.mutable: Set[ast.AST] = set()
+        # definitions bound to a list
+        self.lists: Set[ast.AST] = set()
+        # If -> names assigned in both of its branches
+        self.common: Dict[ast.If, FrozenSet[str]] = {}
+        # scope -> classes defined and modules imported in it
+        self.namespaces: Dict[ast.AST, Set[str]] = {}
+        # functions returning a value, functions calling themselves
+        self.returning: Set[ast.AST] = set()
+        self.recursive: Set[ast.AST] = set()
+        if tree is not None:
+            self.analyse(tree)
+
+    def analyse(self, tree: ast.AST):
+        # (node, innermost scope, innermost owner scope), children are
+        # pushed reversed to be analysed in source order
+        stack = [(tree, None, None)]
+        while stack:
+            node, scope, owner = stack.pop()
+            if scope is not None and isinstance(node, _TRACKED):
+                self.scopes[node] = scope
+            if isinstance(node, SCOPE_NODES):
+                self.parents[node] = scope
+            handler = self._handlers.get(type(node))
+            if handler is not None:
+                handler(self, node, scope, owner)
+            if isinstance(node, SCOPE_NODES):
+                scope = node
+                if isinstance(node, OWNER_NODES):
+                    owner = node
+            children = list(ast.iter_child_nodes(node))
+            for child in reversed(children):
+                stack.append((child, scope, owner))
+        return self
+
+    # lookups used by emission
+
+    def scope(self, node: ast.AST) -> Optional[ast.AST]:
+        return self.scopes.get(node)
+
+    def find(self, name: str, node: ast.AST) -> Optional[ast.AST]:
+        """Node first binding *name* in the scopes visible from *node*"""
+        return self._lookup(name, self.scopes.get(node))
+
+    def is_module_level(self, node: ast.AST) -> bool:
+        return isinstance(self.scopes.get(node), ast.Module)
+
+    def is_reassignment(self, target: ast.AST) -> bool:
+        return target in self.reassigned
+
+    def is_mutable(self, target: ast.Name) -> bool:
+        return self.find(target.id, target) in self.mutable
+
+    def is_list(self, node: ast.AST) -> bool:
+        if isinstance(node, ast.List):
+            return True
+        if isinstance(node, ast.Name):
+            return self.find(node.id, node) in self.lists
+        return False
+
+    def common_vars(self, node: ast.If) -> FrozenSet[str]:
+        return self.common.get(node, _EMPTY)
+
+    def is_class_or_module(self, name: str, node: ast.AST) -> bool:
+        scope = self.scopes.get(node)
+        while scope is not None:
+            if name in self.namespaces.get(scope, _EMPTY):
+                return True
+            scope = self.parents.get(scope)
+        return False
+
+    def returns_value(self, function: ast.AST) -> bool:
+        return function in self.returning
+
+    def is_recursive(self, function: ast.AST) -> bool:
+        return function in self.recursive
+
+    # bindings
+
+    def _lookup(self, name: str, scope: Optional[ast.AST], stop: ast.AST = None) -> Optional[ast.AST]:
+        while scope is not None:
+            definition = self.definitions.get(scope, {}).get(name)
+            if definition is not None or scope is stop:
+                return definition
+            scope = self.parents.get(scope)
+        return None
+
+    def _bind(self, node: ast.AST, name: str, scope: ast.AST, owner: ast.AST, value: ast.AST = None):
+        definition = self._lookup(name, scope, owner)
+        if definition is None:
+            definition = self.definitions.setdefault(scope, {})[name] = node
+        else:
+            self.reassigned.add(node)
+            self.mutable.add(definition)
+        if value is not None and (isinstance(value, ast.List) or
+                                  isinstance(value, ast.Name) and self._lookup(value.id, scope) in self.lists):
+            self.lists.add(definition)
+
+    def _mutate(self, node: ast.AST, scope: ast.AST):
+        name = base_name(node)
+        if name is not None:
+            definition = self._lookup(name.id, scope)
+            if definition is not None:
+                self.mutable.add(definition)
+
+    # handlers, called before the children of their node
+
+    def _on_Assign(self, node, scope, owner):
+        for target in node.targets:
+            if isinstance(target, (ast.Attribute, ast.Subscript)):
+                self._mutate(target, scope)
+                continue
+            value = node.value if isinstance(target, ast.Name) else None
+            for name in target_names(target):
+                self._bind(name, name.id, scope, owner, value)
+
+    def _on_AnnAssign(self, node, scope, owner):
+        if isinstance(node.target, ast.Name):
+            self._bind(node.target, node.target.id, scope, owner, node.value)
+        else:
+            self._mutate(node.target, scope)
+
+    def _on_AugAssign(self, node, scope, owner):
+        self._mutate(node.target, scope)
+
+    def _on_Delete(self, node, scope, owner):
+        for target in node.targets:
+            if isinstance(target, (ast.Attribute, ast.Subscript)):
+                self._mutate(target, scope)
+
+    def _on_NamedExpr(self, node, scope, owner):
+        self._bind(node.target, node.target.id, scope, owner, node.value)
+
+    def _on_For(self, node, scope, owner):
+        for name in target_names(node.target):
+            self._bind(name, name.id, node, node)
+
+    def _on_With(self, node, scope, owner):
+        for item in node.items:
+            if item.optional_vars is not None:
+                for name in target_names(item.optional_vars):
+                    self._bind(name, name.id, node, node)
+
+    def _on_FunctionDef(self, node, scope, owner):
+        if scope is not None:
+            self._bind(node, node.name, scope, owner)
+        self._on_Lambda(node, scope, owner)
+
+    def _on_Lambda(self, node, scope, owner):
+        args = node.args
+        for arg in args.posonlyargs + args.args + [args.vararg] + args.kwonlyargs + [args.kwarg]:
+            if arg is not None:
+                self._bind(arg, arg.arg, node, node)
+
+    def _on_ClassDef(self, node, scope, owner):
+        if scope is not None:
+            self._bind(node, node.name, scope, owner)
+            self.namespaces.setdefault(scope, set()).add(node.name)
+
+    def _on_Import(self, node, scope, owner):
+        for alias in node.names:
+            name = alias.asname or alias.name.partition(".")[0]
+            self._bind(alias, name, scope, owner)
+            self.namespaces.setdefault(scope, set()).add(name)
+
+    def _on_ImportFrom(self, node, scope, owner):
+        for alias in node.names:
+            if alias.name != "*":
+                name = alias.asname or alias.name
+                self._bind(alias, name, scope, owner)
+                self.namespaces.setdefault(scope, set()).add(name)
+
+    def _on_If(self, node, scope, owner):
+        # statements directly in a branch, the nested blocks are scopes of their own
+        def assigned(body):
+            names = set()
+            for statement in body:
+                if isinstance(statement, ast.Assign):
+                    for target in statement.targets:
+                        names.update(name.id for name in target_names(target))
+                elif isinstance(statement, ast.AnnAssign) and isinstance(statement.target, ast.Name):
+                    names.add(statement.target.id)
+            return names
+
+        common = assigned(node.body) & assigned(node.orelse)
+        if common:
+            self.common[node] = frozenset(common)
+
+    def _on_Return(self, node, scope, owner):
+        if node.value is not None and isinstance(owner, FUNCTION_NODES):
+            self.returning.add(owner)
+
+    def _on_Call(self, node, scope, owner):
+        func = node.func
+        if isinstance(func, ast.Name):
+            if isinstance(owner, FUNCTION_NODES) and func.id == owner.name:
+                self.recursive.add(owner)
+        elif isinstance(func, ast.Attribute) and func.attr in MUTATING_METHODS:
+            self._mutate(func.value, scope)
+
+    # node type -> handler, filled below
+    _handlers = {}
+
+
+ScopeAnalysis._handlers = {
+    ast.Assign: ScopeAnalysis._on_Assign,
+    ast.AnnAssign: ScopeAnalysis._on_AnnAssign,
+    ast.AugAssign: ScopeAnalysis._on_AugAssign,
+    ast.Delete: ScopeAnalysis._on_Delete,
+    ast.NamedExpr: ScopeAnalysis._on_NamedExpr,
+    ast.For: ScopeAnalysis._on_For,
+    ast.AsyncFor: ScopeAnalysis._on_For,
+    ast.With: ScopeAnalysis._on_With,
+    ast.AsyncWith: ScopeAnalysis._on_With,
+    ast.FunctionDef: ScopeAnalysis._on_FunctionDef,
+    ast.AsyncFunctionDef: ScopeAnalysis._on_FunctionDef,
+    ast.Lambda: ScopeAnalysis._on_Lambda,
+    ast.ClassDef: ScopeAnalysis._on_ClassDef,
+    ast.Import: ScopeAnalysis._on_Import,
+    ast.ImportFrom: ScopeAnalysis._on_ImportFrom,
+    ast.If: ScopeAnalysis._on_If,
+    ast.Return: ScopeAnalysis._on_Return,
+    ast.Call: ScopeAnalysis._on_Call,
+}
@@ -1,12 +1,12 @@
 import ast
 from copy import deepcopy
 
-from visitors.base import BaseModuleVisitor
-from visitors.rust.utils import is_void_function, get_id, \
-    is_class_or_module, is_list, DeclarationExtractor, defined_before, is_mutable
+from visitors.c import CVisitor
+from visitors.rust.analysis import ScopeAnalysis
+from visitors.rust.utils import get_id, DeclarationExtractor
 
 
-class BaseRustVisitor(BaseModuleVisitor):
+class BaseRustVisitor(CVisitor):
     # allowed as names in Python but treated as keywords in Rust
     rust_keywords = frozenset([
         "struct",
@@ -40,12 +40,24 @@ class BaseRustVisitor(BaseModuleVisitor):
         # "Any": "PyAny"
     }
 
-    def __init__(self):
+    def __init__(self, traversal: str = None):
+        super().__init__(traversal=traversal)
         self.headers = ['use std::*;',
                         "use std::collections::HashMap;", ""]
+        # scopes, mutability and returns of the module, see transpile()
+        self.analysis = ScopeAnalysis()
 
-    def visit_FunctionDef(self, node):
-        body = "\n".join([self.visit(n) for n in node.body])
+    def transpile(self, node: ast.Module, indent=None):
+        self.analysis = ScopeAnalysis(node)
+        return super().transpile(node, indent=indent)
+
+    def declaration_extractor(self) -> DeclarationExtractor:
+        """Extractor of class members, rendering with the analysis of this module"""
+        transpiler = BaseRustVisitor()
+        transpiler.analysis = self.analysis
+        return DeclarationExtractor(transpiler)
+
+    def visit_FunctionDef(self, node, level=0):
         typenames, args = self.visit(node.args)
 
         args_list = []
@@ -66,7 +78,7 @@ class BaseRustVisitor(BaseModuleVisitor):
             args_list.append("{0}: {1}".format(arg, typename))
 
         return_type = ""
-        if not is_void_function(node):
+        if self.analysis.returns_value(node):
             if node.returns:
                 return_type = "-> {0}".format(self.visit(node.returns))
             else:
@@ -79,9 +91,11 @@ class BaseRustVisitor(BaseModuleVisitor):
 
         funcdef = "fn {0}{1}({2}) {3}".format(node.name, template,
                                               ", ".join(args_list), return_type)
-        return funcdef + " {\n" + body + "\n}"
+        self.writer.line(level, funcdef + " {")
+        self.write_block(node.body, level + 1)
+        self.writer.line(level, "}")
 
-    def visit_arguments(self, node):
+    def visit_arguments(self, node, level=0):
         args = [self.visit(arg) for arg in node.args]
 
         # switch to zip
@@ -93,7 +107,7 @@ class BaseRustVisitor(BaseModuleVisitor):
 
         return types, names
 
-    def visit_arg(self, node):
+    def visit_arg(self, node, level=0):
         id = get_id(node)
         if id == "self":
             return (None, "self")
@@ -102,29 +116,29 @@ class BaseRustVisitor(BaseModuleVisitor):
             typename = self.visit(node.annotation)
         return (typename, id)
 
-    def visit_Lambda(self, node):
+    def visit_Lambda(self, node, level=0):
         _, args = self.visit(node.args)
         args_string = ", ".join(args)
         body = self.visit(node.body)
         return "|{0}| {1}".format(args_string, body)
 
-    def visit_Attribute(self, node):
+    def visit_Attribute(self, node, level=0):
         attr = node.attr
 
         value_id = self.visit(node.value)
 
-        if is_list(node.value):
+        if self.analysis.is_list(node.value):
             if node.attr == "append":
                 attr = "push"
         if not value_id:
             value_id = ""
 
-        if is_class_or_module(value_id, node.scopes):
+        if self.analysis.is_class_or_module(value_id, node):
             return "{0}::{1}".format(value_id, attr);
 
         return value_id + "." + attr
 
-    def visit_Call(self, node):
+    def visit_Call(self, node, level=0):
         fname = self.visit(node.func)
 
         args = []
@@ -184,16 +198,14 @@ class BaseRustVisitor(BaseModuleVisitor):
 
         return '{0}({1})'.format(fname, args)
 
-    def visit_For(self, node):
+    def visit_For(self, node, level=0):
         target = self.visit(node.target)
         it = self.visit(node.iter)
-        buf = []
-        buf.append('for {0} in {1} {{'.format(target, it))
-        buf.extend([self.visit(c) for c in node.body])
-        buf.append("}")
-        return "\n".join(buf)
+        self.writer.line(level, 'for {0} in {1} {{'.format(target, it))
+        self.write_block(node.body, level + 1)
+        self.writer.line(level, "}")
 
-    # def visit_Expr(self, node):
+    # def visit_Expr(self, node, level=0):
     #     s = self.visit(node.value)
     #     if s.strip() and not s.endswith(';'):
     #         s += ';'
@@ -202,15 +214,15 @@ class BaseRustVisitor(BaseModuleVisitor):
     #     else:
     #         return s
 
-    def visit_Str(self, node):
+    def visit_Str(self, node, level=0):
         return ("" +
                 super(BaseRustVisitor, self).visit_Str(node) + "")
 
-    def visit_Bytes(self, node):
+    def visit_Bytes(self, node, level=0):
         bytes_str = "{0}".format(node.s)
         return bytes_str.replace("'", '"')  # replace single quote with double quote
 
-    def visit_Compare(self, node):
+    def visit_Compare(self, node, level=0):
         left = self.visit(node.left)
         right = self.visit(node.comparators[0])
         if isinstance(node.ops[0], ast.In):
@@ -220,13 +232,13 @@ class BaseRustVisitor(BaseModuleVisitor):
 
         return super(BaseRustVisitor, self).visit_Compare(node)
 
-    def visit_Name(self, node):
+    def visit_Name(self, node, level=0):
         if node.id == 'None':
             return 'None'
         else:
             return super(BaseRustVisitor, self).visit_Name(node)
 
-    def visit_NameConstant(self, node):
+    def visit_NameConstant(self, node, level=0):
         if node.value is True:
             return "true"
         elif node.value is False:
@@ -236,29 +248,25 @@ class BaseRustVisitor(BaseModuleVisitor):
         else:
             return super(BaseRustVisitor, self).visit_NameConstant(node)
 
-    def visit_If(self, node):
-        body_vars = set([get_id(v) for v in node.scopes[-1].body_vars])
-        orelse_vars = set([get_id(v) for v in node.scopes[-1].orelse_vars])
-        node.common_vars = body_vars.intersection(orelse_vars)
-
+    def visit_If(self, node, level=0):
         # TODO find out if this can be useful
         var_definitions = []
-        # for cv in node.common_vars:
-        #     definition = node.scopes.find(cv)
+        # for cv in self.analysis.common_vars(node):
+        #     definition = self.analysis.find(cv, node)
         #     var_type = decltype(definition)
         #     var_definitions.append("{0} {1};\n".format(var_type, cv))
 
         # HACK to determine if main function name is visited
         if self.visit(node.test) == '__name__ == "__main__"':
-            buf = ["fn main() {", ]
-            buf.extend([self.visit(child) for child in node.body])
-            buf.append("}")
-            return "\n".join(buf)
+            self.writer.line(level, "fn main() {")
+            self.write_block(node.body, level + 1)
+            self.writer.line(level, "}")
         else:
-            return ("".join(var_definitions) +
-                    super(BaseRustVisitor, self).visit_If(node))
+            for definition in var_definitions:
+                self.writer.line(level, definition)
+            super(BaseRustVisitor, self).visit_If(node, level)
 
-    def visit_UnaryOp(self, node):
+    def visit_UnaryOp(self, node, level=0):
         if isinstance(node.op, ast.USub):
             if isinstance(node.operand, (ast.Call, ast.Num)):
                 # Shortcut if parenthesis are not needed
@@ -268,7 +276,7 @@ class BaseRustVisitor(BaseModuleVisitor):
         else:
             return super(BaseRustVisitor, self).visit_UnaryOp(node)
 
-    def visit_BinOp(self, node):
+    def visit_BinOp(self, node, level=0):
         if (isinstance(node.left, ast.List)
                 and isinstance(node.op, ast.Mult)
                 and isinstance(node.right, ast.Num)):
@@ -277,15 +285,13 @@ class BaseRustVisitor(BaseModuleVisitor):
         else:
             return super(BaseRustVisitor, self).visit_BinOp(node)
 
-    def visit_Module(self, node):
-        buf = []
+    def visit_Module(self, node, level=0):
         for header in self.headers:
-            buf.append(header);
-        buf += [self.visit(b) for b in node.body]
-        return "\n".join(buf)
+            self.writer.line(level, header)
+        self.write_block(node.body, level)
 
-    def visit_ClassDef(self, node):
-        extractor = DeclarationExtractor(BaseRustVisitor())
+    def visit_ClassDef(self, node, level=0):
+        extractor = self.declaration_extractor()
         extractor.visit(node)
         declarations = extractor.get_declarations()
 
@@ -297,29 +303,35 @@ class BaseRustVisitor(BaseModuleVisitor):
                 index += 1
             fields.append("{0}: {1},".format(declaration, typename))
 
-        struct_def = "struct {0} {{\n{1}\n}}\n\n".format(node.name, "\n".join(fields));
-        impl_def = "impl {0} {{\n".format(node.name);
-        buf = [self.visit(b) for b in node.body]
-        return "{0}{1}{2} \n}}".format(struct_def, impl_def, "\n".join(buf))
+        self.writer.line(level, "struct {0} {{".format(node.name))
+        for field in fields:
+            self.writer.line(level + 1, field)
+        self.writer.line(level, "}")
+        self.writer.line(level, "")
+        self.writer.line(level, "impl {0} {{".format(node.name))
+        self.write_block(node.body, level + 1)
+        self.writer.line(level, "}")
 
-    def visit_alias(self, node):
+    def visit_alias(self, node, level=0):
         return 'use {0};'.format(node.name)
 
-    def visit_Import(self, node):
-        imports = [self.visit(n) for n in node.names]
-        return "\n".join(i for i in imports if i)
+    def visit_Import(self, node, level=0):
+        for name in node.names:
+            use = self.visit(name)
+            if use:
+                self.writer.line(level, use)
 
-    def visit_ImportFrom(self, node):
+    def visit_ImportFrom(self, node, level=0):
         if node.module == "typing" or \
                 node.module == "enum":
-            return ""
+            return
 
         names = [n.name for n in node.names]
         names = ", ".join(names)
         module_path = node.module.replace(".", "::")
-        return "use {0}::{{{1}}};".format(module_path, names)
+        self.writer.line(level, "use {0}::{{{1}}};".format(module_path, names))
 
-    def visit_List(self, node):
+    def visit_List(self, node, level=0):
         if len(node.elts) > 0:
             elements = [self.visit(e) for e in node.elts]
             return "vec![{0}]".format(", ".join(elements))
@@ -327,7 +339,7 @@ class BaseRustVisitor(BaseModuleVisitor):
         else:
             return "vec![]"
 
-    def visit_Dict(self, node):
+    def visit_Dict(self, node, level=0):
         if len(node.keys) > 0:
             kv_string = []
             for i in range(len(node.keys)):
@@ -339,7 +351,7 @@ class BaseRustVisitor(BaseModuleVisitor):
         else:
             return "HashMap::new()"
 
-    def visit_Subscript(self, node):
+    def visit_Subscript(self, node, level=0):
         value = self.visit(node.value)
         index = self.visit(node.slice)
         if hasattr(node, "is_annotation"):
@@ -350,10 +362,10 @@ class BaseRustVisitor(BaseModuleVisitor):
             return "{0}<{1}>".format(value, index)
         return "{0}[{1}]".format(value, index)
 
-    def visit_Index(self, node):
+    def visit_Index(self, node, level=0):
         return self.visit(node.value)
 
-    def visit_Slice(self, node):
+    def visit_Slice(self, node, level=0):
         lower = ""
         if node.lower:
             lower = self.visit(node.lower)
@@ -363,52 +375,49 @@ class BaseRustVisitor(BaseModuleVisitor):
 
         return "{0}..{1}".format(lower, upper)
 
-    def visit_Elipsis(self, node):
+    def visit_Elipsis(self, node, level=0):
         return "compile_error!('Elipsis is not supported');"
 
-    def visit_Tuple(self, node):
+    def visit_Tuple(self, node, level=0):
         elts = [self.visit(e) for e in node.elts]
         elts = ", ".join(elts)
         if hasattr(node, "is_annotation"):
             return elts
         return "({0})".format(elts)
 
-    def visit_unsupported_body(self, name, body):
-        buf = ['let {0} = {{ //unsupported'.format(name)]
-        buf += [self.visit(n) for n in body]
-        buf.append('};')
-        return buf;
+    def visit_unsupported_body(self, name, body, level=0):
+        self.writer.line(level, 'let {0} = {{ //unsupported'.format(name))
+        self.write_block(body, level + 1)
+        self.writer.line(level, '};')
 
-    def visit_Try(self, node, finallybody=None):
-        buf = self.visit_unsupported_body("try_dummy", node.body)
+    def visit_Try(self, node, level=0, finallybody=None):
+        self.visit_unsupported_body("try_dummy", node.body, level)
 
-        for handler in node.handlers:
-            buf += self.visit(handler)
-        # buf.append("\n".join(excepts));
+        self.write_block(node.handlers, level)
 
         if finallybody:
-            buf += self.visit_unsupported_body("finally_dummy", finallybody)
-
-        return '\n'.join(buf)
+            self.visit_unsupported_body("finally_dummy", finallybody, level)
 
-    def visit_ExceptHandler(self, node):
+    def visit_ExceptHandler(self, node, level=0):
         exception_type = ""
         if node.type:
             exception_type = self.visit(node.type)
         name = "except!({0})".format(exception_type)
-        body = self.visit_unsupported_body(name, node.body)
-        return body
+        self.visit_unsupported_body(name, node.body, level)
 
-    def visit_Assert(self, node):
-        return "assert!({0});".format(self.visit(node.test))
+    def visit_Assert(self, node, level=0):
+        self.writer.line(level, "assert!({0});".format(self.visit(node.test)))
 
-    def visit_AnnAssign(self, node):
+    def visit_AnnAssign(self, node, level=0):
         target = self.visit(node.target)
         type_str = self.visit(node.annotation)
         val = self.visit(node.value)
-        return "let {0}: {1} = {2};".format(target, type_str, val)
+        self.writer.line(level, "let {0}: {1} = {2};".format(target, type_str, val))
 
-    def visit_Assign(self, node):
+    def visit_Assign(self, node, level=0):
+        self.writer.line(level, self.assign_statement(node))
+
+    def assign_statement(self, node):
         target = node.targets[0]
 
         if isinstance(target, ast.Tuple):
@@ -416,10 +425,11 @@ class BaseRustVisitor(BaseModuleVisitor):
             value = self.visit(node.value)
             return "let ({0}) = {1};".format(", ".join(elts), value)
 
-        if isinstance(node.scopes[-1], ast.If):
-            outer_if = node.scopes[-1]
+        analysis = self.analysis
+        outer_if = analysis.scope(node)
+        if isinstance(outer_if, ast.If):
             target_id = self.visit(target)
-            if target_id in outer_if.common_vars:
+            if target_id in analysis.common_vars(outer_if):
                 value = self.visit(node.value)
                 return "{0} = {1};".format(target_id, value)
 
@@ -431,46 +441,42 @@ class BaseRustVisitor(BaseModuleVisitor):
                 value = 'None'
             return "{0} = {1};".format(target, value)
 
-        definition = node.scopes.find(target.id)
-        if (isinstance(target, ast.Name) and
-                defined_before(definition, node)):
+        if analysis.is_reassignment(target):
             target = self.visit(target)
             value = self.visit(node.value)
             return "{0} = {1};".format(target, value)
         elif isinstance(node.value, ast.List):
             elements = [self.visit(e) for e in node.value.elts]
             mut = ""
-            if is_mutable(node.scopes, get_id(target)):
+            if analysis.is_mutable(target):
                 mut = "mut "
             return "let {0}{1} = vec![{2}];".format(mut, self.visit(target), ", ".join(elements))
         else:
             mut = ""
-            if is_mutable(node.scopes, get_id(target)):
+            if analysis.is_mutable(target):
                 mut = "mut "
 
             target = self.visit(target)
             value = self.visit(node.value)
 
-            if len(node.scopes) == 1:
-                if isinstance(node.scopes[0], ast.Module):  # if assignment is module level it must be const
-                    return "const {0}: _ = {1};".format(target, value)
+            if analysis.is_module_level(node):  # if assignment is module level it must be const
+                return "const {0}: _ = {1};".format(target, value)
 
             return "let {0}{1} = {2};".format(mut, target, value)
 
-    def visit_Delete(self, node):
+    def visit_Delete(self, node, level=0):
         target = node.targets[0]
-        return "{0}.drop();".format(self.visit(target))
+        self.writer.line(level, "{0}.drop();".format(self.visit(target)))
 
-    def visit_Raise(self, node):
+    def visit_Raise(self, node, level=0):
         if node.exc is not None:
-            return "raise!({0}); //unsupported".format(self.visit(node.exc))
+            self.writer.line(level, "raise!({0}); //unsupported".format(self.visit(node.exc)))
+            return
         # This handles the case where `raise` is used without
         # specifying the exception.
-        return "raise!(); //unsupported"
-
-    def visit_With(self, node):
-        buf = []
+        self.writer.line(level, "raise!(); //unsupported")
 
+    def visit_With(self, node, level=0):
         with_statement = "// with!("
         for i in node.items:
             if i.optional_vars:
@@ -478,36 +484,30 @@ class BaseRustVisitor(BaseModuleVisitor):
                                                         self.visit(i.optional_vars))
             else:
                 with_statement += "{0}, ".format(self.visit(i.context_expr))
-        with_statement = with_statement[:-2] + ") //unsupported\n{"
-        buf.append(with_statement)
-
-        for n in node.body:
-            buf.append(self.visit(n))
-
-        buf.append('}')
+        self.writer.line(level, with_statement[:-2] + ") //unsupported")
+        self.writer.line(level, "{")
+        self.write_block(node.body, level + 1)
+        self.writer.line(level, '}')
 
-        return "\n".join(buf)
-
-    def visit_Await(self, node):
+    def visit_Await(self, node, level=0):
         return "await!({0})".format(self.visit(node.value))
 
-    def visit_AsyncFunctionDef(self, node):
-        return "    #[async]\n{0}".format(self.visit_FunctionDef(node))
+    def visit_AsyncFunctionDef(self, node, level=0):
+        self.writer.line(level, "#[async]")
+        self.visit_FunctionDef(node, level)
 
-    def visit_Yield(self, node):
+    def visit_Yield(self, node, level=0):
         return "//yield is unimplemented"
 
-    def visit_Print(self, node):
-        buf = []
+    def visit_Print(self, node, level=0):
         for n in node.values:
             value = self.visit(n)
-            buf.append('println!("{{:?}}",{0});'.format(value))
-        return '\n'.join(buf)
+            self.writer.line(level, 'println!("{{:?}}",{0});'.format(value))
 
-    def visit_DictComp(self, node):
+    def visit_DictComp(self, node, level=0):
         return "DictComp /*unimplemented()*/"
 
-    def visit_GeneratorExp(self, node):
+    def visit_GeneratorExp(self, node, level=0):
         elt = self.visit(node.elt)
         generator = node.generators[0]
         target = self.visit(generator.target)
@@ -524,16 +524,16 @@ class BaseRustVisitor(BaseModuleVisitor):
 
         return "{0}{1}{2}.collect::<Vec<_>>()".format(iter, filter_str, map_str)
 
-    def visit_ListComp(self, node):
+    def visit_ListComp(self, node, level=0):
         return self.visit_GeneratorExp(node)  # right now they are the same
 
-    def visit_Global(self, node):
-        return "//global {0}".format(", ".join(node.names))
+    def visit_Global(self, node, level=0):
+        self.writer.line(level, "//global {0}".format(", ".join(node.names)))
 
-    def visit_Starred(self, node):
+    def visit_Starred(self, node, level=0):
         return "starred!({0})/*unsupported*/".format(self.visit(node.value))
 
-    def visit_Set(self, node):
+    def visit_Set(self, node, level=0):
         elts = []
         for i in range(len(node.elts)):
             elt = self.visit(node.elts[i])
@@ -545,7 +545,7 @@ class BaseRustVisitor(BaseModuleVisitor):
         else:
             return "HashSet::new()"
 
-    def visit_IfExp(self, node):
+    def visit_IfExp(self, node, level=0):
         body = self.visit(node.body)
         orelse = self.visit(node.orelse)
         test = self.visit(node.test)
@@ -553,163 +553,23 @@ class BaseRustVisitor(BaseModuleVisitor):
 
 
 class Pyo3RustVisitor(BaseRustVisitor):
-    types_mapping = {
-        "int": "i32",
-        "float": "f32",
-        "bytes": "&[u8]",
-        "&str": "String",
-        "Any": "PyAny"
-    }
-
-    def __init__(self):
-        super().__init__()
-        self.headers = ['use std::*;',
-                        "use std::collections::HashMap;",
-                        "use pyo3::prelude::*;",
-                        "use pyo3::types::*;",
-                        ""]
-
-    def visit_FunctionDef(self, node):
-        # FIXME super() built-in call return NoneType
-
-        if node.name == '__init__':
-            result = [str(self.visit(i)).split(" ")[2][:-1] for i in node.body]
-            body = 'return Self{%s};' % ", ".join(result)
-
-        else:
-            result = [self.visit(n) for n in node.body]
-            body = "\n".join(result)
-
-        result = [i for i in result if i]
-
-        typenames, args = self.visit(node.args)
-        args_list = []
-        if args and args[0] == "self":
-            del typenames[0]
-            del args[0]
-            if not node.name == '__init__':
-                args_list.append("&mut self")
-
-        typedecls = []
-        index = 0
-        for i in range(len(args)):
-            typename = typenames[i]
-            arg = args[i]
-            if typename == "T":
-                typename = "T{0}".format(index)
-                typedecls.append(typename)
-                index += 1
-            if typename in Pyo3RustVisitor.types_mapping:
-                typename = Pyo3RustVisitor.types_mapping[typename]
-
-            args_list.append("{0}: {1}".format(arg, typename))
-
-        return_type = ""
-        if not is_void_function(node):
-            if node.returns:
-                return_type = "-> {0}".format(self.visit(node.returns))
-            else:
-                return_type = "-> RT"
-                typedecls.append("RT")
-
-        template = ""
-        if len(typedecls) > 0:
-            template = "<{0}>".format(", ".join(typedecls))
-
-        if node.name == '__init__':
-            node.__setattr__("name", "__new__")
-            return_type = "-> Self"
-            head = '#[new(args = "*", kwargs = "**")]\n'
-            funcdef = head + "pub fn {0}{1}({2}) {3}".format(node.name, template,
-                                                             ", ".join(args_list), return_type)
-
-        else:
-            # head = '#[args = "*", kwargs = "**"]\n'
-            head = ""
-            funcdef = head + "pub fn {0}{1}({2}) {3}".format(node.name, template,
-                                                             ", ".join(args_list), return_type)
-
-        return funcdef + " {\n" + body + "\n}"
-
-    def build_struct(self, node: ast.ClassDef, fields: list):
-        # #[pyclass(name = "name", text_signature = "(arg1, arg2)", subclass, weakref)]
-        extends = None
-        if node.bases:
-            extends = self.parse_inheritance(node)
-
-        if extends:
-            head = f'#[pyclass(name = "{node.name}", extends = {extends}, subclass, weakref)]\n'
-        else:
-            head = f'#[pyclass(name = "{node.name}", subclass, weakref)]\n'
-
-        body = "pub struct {0} {{\n{1}\n}}\n\n".format(node.name, "\n".join(fields))
-
-        return head + body
-
-    def build_implementation(self, nodename):
-        head = '#[pymethods]\n'
-        return head + "impl {0} {{\n".format(nodename)
-
-    def visit_ClassDef(self, node):
-        extractor = DeclarationExtractor(BaseRustVisitor())
-        extractor.visit(node)
-        declarations = extractor.get_declarations()
-
-        fields = []
-        index = 0
-        for declaration, typename in declarations.items():
-            if typename == None:
-                typename = "ST{0}".format(index)
-                index += 1
-            if typename in Pyo3RustVisitor.types_mapping:
-                typename = Pyo3RustVisitor.types_mapping[typename]
-            fields.append("{0}: {1},".format(declaration, typename))
-
-        struct_def = self.build_struct(node, fields)
-        impl_def = self.build_implementation(node.name)
-
-        buf = [self.visit(b) for b in node.body]
-        return "{0}{1}{2} \n\n}}\n".format(struct_def, impl_def, "\n".join(buf))
-
-    @staticmethod
-    def parse_inheritance(node: ast.ClassDef):
-        name = None
-        if node.bases:
-            item: ast.Name = node.bases[0]
-
-            name = item.id
-
-        return name
-
-
-class Pyo3RustVisitor(BaseRustVisitor):
-    types_mapping = deepcopy(super().types_mapping)
+    types_mapping = deepcopy(BaseRustVisitor.types_mapping)
     pyo3_types = {
         "Any": "PyAny"
     }
     types_mapping.update(**pyo3_types)
 
-    def __init__(self):
-        super().__init__()
+    def __init__(self, traversal: str = None):
+        super().__init__(traversal=traversal)
         self.headers = ['use std::*;',
                         "use std::collections::HashMap;",
                         "use pyo3::prelude::*;",
                         "use pyo3::types::*;",
                         ""]
 
-    def visit_FunctionDef(self, node):
+    def visit_FunctionDef(self, node, level=0):
         # FIXME super() built-in call return NoneType
 
-        if node.name == '__init__':
-            result = [str(self.visit(i)).split(" ")[2][:-1] for i in node.body]
-            body = 'return Self{%s};' % ", ".join(result)
-
-        else:
-            result = [self.visit(n) for n in node.body]
-            body = "\n".join(result)
-
-        result = [i for i in result if i]
-
         typenames, args = self.visit(node.args)
         args_list = []
         if args and args[0] == "self":
@@ -733,7 +593,7 @@ class Pyo3RustVisitor(BaseRustVisitor):
             args_list.append("{0}: {1}".format(arg, typename))
 
         return_type = ""
-        if not is_void_function(node):
+        if self.analysis.returns_value(node):
             if node.returns:
                 return_type = "-> {0}".format(self.visit(node.returns))
             else:
@@ -745,41 +605,45 @@ class Pyo3RustVisitor(BaseRustVisitor):
             template = "<{0}>".format(", ".join(typedecls))
 
         if node.name == '__init__':
+            result = [str(self.render(i)).split(" ")[2][:-1] for i in node.body]
             node.__setattr__("name", "__new__")
             return_type = "-> Self"
-            head = '#[new(args = "*", kwargs = "**")]\n'
-            funcdef = head + "pub fn {0}{1}({2}) {3}".format(node.name, template,
-                                                             ", ".join(args_list), return_type)
+            self.writer.line(level, '#[new(args = "*", kwargs = "**")]')
+            self.writer.line(level, "pub fn {0}{1}({2}) {3} {{".format(node.name, template,
+                                                                    ", ".join(args_list), return_type))
+            self.writer.line(level + 1, 'return Self{%s};' % ", ".join(result))
 
         else:
-            # head = '#[args = "*", kwargs = "**"]\n'
-            head = ""
-            funcdef = head + "pub fn {0}{1}({2}) {3}".format(node.name, template,
-                                                             ", ".join(args_list), return_type)
+            # head = '#[args = "*", kwargs = "**"]'
+            self.writer.line(level, "pub fn {0}{1}({2}) {3} {{".format(node.name, template,
+                                                                    ", ".join(args_list), return_type))
+            self.write_block(node.body, level + 1)
 
-        return funcdef + " {\n" + body + "\n}"
+        self.writer.line(level, "}")
 
-    def build_struct(self, node: ast.ClassDef, fields: list):
+    def build_struct(self, node: ast.ClassDef, fields: list, level=0):
         # #[pyclass(name = "name", text_signature = "(arg1, arg2)", subclass, weakref)]
         extends = None
         if node.bases:
             extends = self.parse_inheritance(node)
 
         if extends:
-            head = f'#[pyclass(name = "{node.name}", extends = {extends}, subclass, weakref)]\n'
+            self.writer.line(level, f'#[pyclass(name = "{node.name}", extends = {extends}, subclass, weakref)]')
         else:
-            head = f'#[pyclass(name = "{node.name}", subclass, weakref)]\n'
-
-        body = "pub struct {0} {{\n{1}\n}}\n\n".format(node.name, "\n".join(fields))
+            self.writer.line(level, f'#[pyclass(name = "{node.name}", subclass, weakref)]')
 
-        return head + body
+        self.writer.line(level, "pub struct {0} {{".format(node.name))
+        for field in fields:
+            self.writer.line(level + 1, field)
+        self.writer.line(level, "}")
+        self.writer.line(level, "")
 
-    def build_implementation(self, nodename):
-        head = '#[pymethods]\n'
-        return head + "impl {0} {{\n".format(nodename)
+    def build_implementation(self, nodename, level=0):
+        self.writer.line(level, '#[pymethods]')
+        self.writer.line(level, "impl {0} {{".format(nodename))
 
-    def visit_ClassDef(self, node):
-        extractor = DeclarationExtractor(BaseRustVisitor())
+    def visit_ClassDef(self, node, level=0):
+        extractor = self.declaration_extractor()
         extractor.visit(node)
         declarations = extractor.get_declarations()
 
@@ -793,11 +657,10 @@ class Pyo3RustVisitor(BaseRustVisitor):
                 typename = Pyo3RustVisitor.types_mapping[typename]
             fields.append("{0}: {1},".format(declaration, typename))
 
-        struct_def = self.build_struct(node, fields)
-        impl_def = self.build_implementation(node.name)
-
-        buf = [self.visit(b) for b in node.body]
-        return "{0}{1}{2} \n\n}}\n".format(struct_def, impl_def, "\n".join(buf))
+        self.build_struct(node, fields, level)
+        self.build_implementation(node.name, level)
+        self.write_block(node.body, level + 1)
+        self.writer.line(level, "}")
 
     @staticmethod
     def parse_inheritance(node: ast.ClassDef):
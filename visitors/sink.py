@@ -0,0 +1,102 @@
+from typing import List, Tuple
+
+from visitors.output import DiskOutput, Output
+
+
+def text_size(text) -> Tuple[int, int]:
+    """Lines and UTF-8 bytes of *text*, str or bytes"""
+    if isinstance(text, str):
+        newline = "\n"
+        size = len(text) if text.isascii() else len(text.encode("utf-8", "surrogateescape"))
+    else:
+        newline = b"\n"
+        size = len(text)
+    lines = text.count(newline)
+    if text and not text.endswith(newline):
+        lines += 1
+    return lines, size
+
+
+class InstructionSink:
+    """Collects generated top-level statements of one module in memory"""
+    separator = "\n\n"
+
+    def __init__(self):
+        self.instructions: List[str] = []
+
+    def __len__(self):
+        return len(self.instructions)
+
+    def append(self, instruction: str):
+        self.instructions.append(instruction)
+
+    def getvalue(self) -> str:
+        return self.separator.join(self.instructions)
+
+    def size(self) -> Tuple[int, int]:
+        """Lines and bytes of the generated source"""
+        return text_size(self.getvalue())
+
+    def close(self):
+        pass
+
+    def discard(self):
+        """Drop what was generated, the module failed to transpile"""
+        pass
+
+
+class StreamingInstructionSink(InstructionSink):
+    """
+    Writes generated top-level statements straight into the target file
+    as they are produced, so only the statement being generated is kept
+    in memory.
+    """
+
+    def __init__(self, path: str, output: Output = None):
+        super().__init__()
+        self.path = path
+        self.output = output or DiskOutput()
+        self.count = 0
+        # size of what was written so far, see size()
+        self._newlines = 0
+        self._bytes = 0
+        self._open_line = False
+        self._file = None
+
+    def __len__(self):
+        return self.count
+
+    def _open(self):
+        self._file = self.output.open(self.path)
+        return self._file
+
+    def append(self, instruction: str):
+        if not isinstance(instruction, str):
+            raise TypeError('expected str instruction, got %r' % instruction.__class__.__name__)
+        file = self._file or self._open()
+        if self.count:
+            file.write(self.separator)
+            self._newlines += self.separator.count("\n")
+            self._bytes += len(self.separator)
+            self._open_line = False
+        file.write(instruction)
+        self.count += 1
+        lines, size = text_size(instruction)
+        if instruction:
+            self._open_line = not instruction.endswith("\n")
+        self._newlines += lines - self._open_line
+        self._bytes += size
+
+    def getvalue(self) -> str:
+        raise TypeError('%s does not keep instructions in memory' % self.__class__.__name__)
+
+    def size(self) -> Tuple[int, int]:
+        return self._newlines + self._open_line, self._bytes
+
+    def close(self):
+        file = self._file or self._open()
+        file.close()
+
+    def discard(self):
+        if self._file is not None:
+            self._file.discard()
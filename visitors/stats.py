@@ -0,0 +1,146 @@
+import ast
+import json
+import platform
+import time
+from typing import Dict, List, Optional, Tuple
+
+from visitors.phases import PARSE, PHASES, SAVE, VISIT, PhaseObserver
+from visitors.sink import text_size
+
+# sizes of every module, set once
+SIZES = ("source_lines", "source_bytes", "generated_lines", "generated_bytes")
+# counters of every module, added up over its phases
+COUNTERS = ("cache_hits", "cache_misses", "files_written", "files_unchanged") + \
+    tuple(f"{phase}_s" for phase in PHASES)
+
+STATS_FORMAT = 2
+
+
+def module_stats() -> dict:
+    stats = dict.fromkeys(SIZES + COUNTERS, 0)
+    stats.update({f"{phase}_s": 0.0 for phase in PHASES})
+    stats["tree_nodes"] = {}
+    stats["failed"] = False
+    return stats
+
+
+class RunStats(PhaseObserver):
+    """
+    Numbers of every module of a run, gathered around its phases: nodes
+    of its syntax tree by type, source and generated lines and bytes,
+    parse, visit and save durations, AST cache hits and misses and result
+    files written. Durations of a phase exclude the phases of the modules
+    it imports, so that the modules add up to the run. The files of the
+    run also count the __init__.py files created when the output is
+    flushed, which belong to no module.
+
+    The same schema is written for every backend; batch worker processes
+    send their modules back to the parent (see take() and merge()).
+    """
+
+    def __init__(self):
+        self.modules: Dict[str, dict] = {}
+        self.started = time.perf_counter()
+        # [started, time of the nested phases, counters at the start]
+        self._stack: List[list] = []
+        # files written and unchanged by the output of the run, see run_finished()
+        self.files: Optional[Tuple[int, int]] = None
+
+    def module(self, module: str) -> dict:
+        try:
+            return self.modules[module]
+        except KeyError:
+            stats = self.modules[module] = module_stats()
+            return stats
+
+    def start(self, phase: str, module: str, visitor=None, subject=None):
+        stats = self.module(module)
+        counters = None
+        if phase == PARSE:
+            # parsed again for the import graph: same source, counted once
+            stats["source_lines"], stats["source_bytes"] = text_size(subject)
+            cache = visitor.ast_cache if visitor is not None else None
+            if cache is not None:
+                counters = cache, cache.hits, cache.misses
+        elif phase == VISIT:
+            nodes = stats["tree_nodes"]
+            for node in ast.walk(subject):
+                if not isinstance(node, ast.expr_context):
+                    name = type(node).__name__
+                    nodes[name] = nodes.get(name, 0) + 1
+        elif phase == SAVE and subject is not None:
+            counters = subject, subject.written, subject.unchanged
+        self._stack.append([time.perf_counter(), 0.0, counters])
+
+    def finish(self, phase: str, module: str, visitor=None, error: BaseException = None):
+        started, nested, counters = self._stack.pop()
+        elapsed = time.perf_counter() - started
+        if self._stack:
+            self._stack[-1][1] += elapsed
+        stats = self.module(module)
+        stats[f"{phase}_s"] += elapsed - nested
+        if error is not None:
+            stats["failed"] = True
+            return
+        if phase == PARSE and counters is not None:
+            cache, hits, misses = counters
+            stats["cache_hits"] += cache.hits - hits
+            stats["cache_misses"] += cache.misses - misses
+        elif phase == SAVE:
+            stats["generated_lines"], stats["generated_bytes"] = visitor.sink.size()
+            if counters is not None:
+                output, written, unchanged = counters
+                stats["files_written"] += output.written - written
+                stats["files_unchanged"] += output.unchanged - unchanged
+
+    def run_finished(self, output):
+        self.files = output.written, output.unchanged
+
+    def take(self) -> Dict[str, dict]:
+        modules, self.modules = self.modules, {}
+        return modules
+
+    def merge(self, records: Dict[str, dict]):
+        for module, other in records.items():
+            if module not in self.modules:
+                self.modules[module] = other
+                continue
+            stats = self.modules[module]
+            for name in COUNTERS:
+                stats[name] += other[name]
+            for name in SIZES:
+                stats[name] = other[name] or stats[name]
+            for name, count in other["tree_nodes"].items():
+                stats["tree_nodes"][name] = stats["tree_nodes"].get(name, 0) + count
+            stats["failed"] = stats["failed"] or other["failed"]
+
+    def run(self) -> dict:
+        """Totals of the run"""
+        total = module_stats()
+        nodes = total["tree_nodes"]
+        for stats in self.modules.values():
+            for name in SIZES + COUNTERS:
+                total[name] += stats[name]
+            for name, count in stats["tree_nodes"].items():
+                nodes[name] = nodes.get(name, 0) + count
+        if self.files is not None:
+            total["files_written"], total["files_unchanged"] = self.files
+        del total["failed"]
+        total["modules"] = len(self.modules)
+        total["failed_modules"] = sum(stats["failed"] for stats in self.modules.values())
+        total["elapsed_s"] = time.perf_counter() - self.started
+        total["tree_nodes"] = dict(sorted(nodes.items(), key=lambda item: -item[1]))
+        return total
+
+    def to_json(self) -> dict:
+        return {
+            "format": STATS_FORMAT,
+            "python": platform.python_version(),
+            "run": self.run(),
+            "modules": dict(sorted(self.modules.items())),
+        }
+
+    def save(self, path: str):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_json(), f, indent=1)
+            f.write("\n")
@@ -0,0 +1,99 @@
+from typing import List, Optional
+
+
+def close_block(segments: list, start: int, indent: str, rstrip: bool = False, default: str = None):
+    """
+    Apply the block rules to the block written from *start* to the end of
+    *segments*: strip its trailing whitespace and replace it by a *default*
+    line when nothing but whitespace was written.
+    """
+    if rstrip:
+        while len(segments) > start:
+            stripped = segments[-1].rstrip()
+            if stripped:
+                segments[-1] = stripped
+                break
+            segments.pop()
+    if default is not None and not any(segment.strip() for segment in segments[start:]):
+        del segments[start:]
+        if start:
+            segments.append("\n")
+        segments.extend((indent, default))
+
+
+class CodeWriter:
+    """
+    Indentation-aware emitter the visitors write generated lines into.
+
+    Lines are kept as a flat list of segments and joined once in
+    getvalue(), so a statement nested N blocks deep is written once
+    instead of being re-copied by every enclosing block. Indentation
+    prefixes are built once per level and reused.
+
+    A segment may also be a nested CodeWriter reserved with block(), whose
+    lines are written later by the iterative traversal.
+    """
+
+    def __init__(self, tab: str = " " * 4):
+        self.tab = tab
+        self.segments: List = []
+        self._indents: List[str] = [""]
+        self._blocks = 0
+        # set on writers reserved with block()
+        self.continued = False
+        self.block_rules: Optional[tuple] = None
+
+    def indent(self, level: int) -> str:
+        indents = self._indents
+        while len(indents) <= level:
+            indents.append(indents[-1] + self.tab)
+        return indents[level]
+
+    def line(self, level: int, *parts: str):
+        """Start a new line at *level* made of *parts*"""
+        segments = self.segments
+        if segments or self.continued:
+            segments.append("\n")
+        segments.append(self.indent(level))
+        segments.extend(parts)
+
+    def mark(self) -> int:
+        """Position to pass to close_block()"""
+        return len(self.segments)
+
+    def close_block(self, mark: int, level: int, rstrip: bool = False, default: str = None):
+        """Apply the block rules to everything written after *mark*"""
+        close_block(self.segments, mark, self.indent(level), rstrip, default)
+
+    def block(self, level: int, rstrip: bool = False, default: str = None) -> 'CodeWriter':
+        """
+        Reserve the place of a block whose lines are written later. The block
+        rules are applied once its content is known, in getvalue().
+        """
+        block = CodeWriter(self.tab)
+        block._indents = self._indents
+        block.continued = bool(self.segments) or self.continued
+        block.block_rules = (level, rstrip, default)
+        self.segments.append(block)
+        self._blocks += 1
+        return block
+
+    def getvalue(self) -> str:
+        if not self._blocks:
+            return "".join(self.segments)
+
+        out = []
+        stack = [(self, iter(self.segments), 0)]
+        while stack:
+            writer, segments, start = stack[-1]
+            for segment in segments:
+                if isinstance(segment, CodeWriter):
+                    stack.append((segment, iter(segment.segments), len(out)))
+                    break
+                out.append(segment)
+            else:
+                stack.pop()
+                if writer.block_rules:
+                    level, rstrip, default = writer.block_rules
+                    close_block(out, start, writer.indent(level), rstrip, default)
+        return "".join(out)